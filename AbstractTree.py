@@ -0,0 +1,186 @@
+from enum import Enum
+
+from ParseTree import *
+from ParseEvents import ENTER, TOKEN, LEAVE
+from CompilerParser import CompilerParser
+
+
+class NodeKind(Enum):
+    """
+    Kinds of node in a parse tree. Values are the node types used by CompilerParser and Token,
+    so NodeKind(node.getType()) works for any node, including tokens.
+    """
+    CLASS = "class"
+    CLASS_VAR_DEC = "classVarDec"
+    SUBROUTINE = "subroutine"
+    PARAMETER_LIST = "parameterList"
+    SUBROUTINE_BODY = "subroutineBody"
+    VAR_DEC = "varDec"
+    STATEMENTS = "statements"
+    LET_STATEMENT = "letStatement"
+    IF_STATEMENT = "ifStatement"
+    WHILE_STATEMENT = "whileStatement"
+    DO_STATEMENT = "doStatement"
+    RETURN_STATEMENT = "returnStatement"
+    EXPRESSION = "expression"
+    TERM = "term"
+    EXPRESSION_LIST = "expressionList"
+    KEYWORD = "keyword"
+    SYMBOL = "symbol"
+    IDENTIFIER = "identifier"
+    INTEGER_CONSTANT = "integerConstant"
+    STRING_CONSTANT = "stringConstant"
+
+
+# Symbols that only delimit structure the tree shape already records
+PUNCTUATION = frozenset(["(", ")", "{", "}", "[", "]", ";", ",", "."])
+
+# Keywords implied by the kind of the node they start
+IMPLIED_KEYWORDS = {
+    NodeKind.CLASS: frozenset(["class"]),
+    NodeKind.VAR_DEC: frozenset(["var"]),
+    NodeKind.LET_STATEMENT: frozenset(["let"]),
+    NodeKind.IF_STATEMENT: frozenset(["if", "else"]),
+    NodeKind.WHILE_STATEMENT: frozenset(["while"]),
+    NodeKind.DO_STATEMENT: frozenset(["do"]),
+    NodeKind.RETURN_STATEMENT: frozenset(["return"]),
+}
+
+# Wrapper productions that are replaced by their only child
+COLLAPSIBLE = frozenset([NodeKind.EXPRESSION, NodeKind.TERM])
+
+# NodeKind by node type, without going through Enum lookup for every node
+KINDS = {kind.value: kind for kind in NodeKind}
+
+
+class AbstractTree(ParseTree):
+
+    __slots__ = ("kind",)
+
+    def __init__(self, kind):
+        """
+        An interior node of an abstract parse tree. Leaves are the original Tokens.
+        @param kind The NodeKind of the node
+        """
+        ParseTree.__init__(self, kind.value, " ")
+        self.kind = kind
+
+
+    def getKind(self):
+        """
+        Get the kind of this node
+        @return the NodeKind of the node
+        """
+        return self.kind
+
+
+
+class AbstractTreeBuilder():
+
+    def __init__(self):
+        """
+        Event handler for CompilerParser that builds an abstract tree:
+        punctuation and implied keywords are dropped, and expression/term nodes
+        with a single child are replaced by that child.
+        """
+        self.stack = []
+        self.tree = None
+
+
+    def __call__(self, event, value):
+        """
+        Handle a single parse event
+        @param event One of ENTER, TOKEN, LEAVE or ABANDON
+        @param value The node type, or the Token for TOKEN events
+        """
+        if event == TOKEN:
+            node = self.stack[-1]
+            token_type = value.getType()
+            if token_type == "symbol":
+                symbol = value.getValue()
+                if symbol in PUNCTUATION or (symbol == "=" and node.kind is NodeKind.LET_STATEMENT):
+                    return
+            elif token_type == "keyword":
+                implied = IMPLIED_KEYWORDS.get(node.kind)
+                if implied is not None and value.getValue() in implied:
+                    return
+            node.addChild(value)
+        elif event == ENTER:
+            self.stack.append(AbstractTree(NodeKind(value)))
+        elif event == LEAVE:
+            node = self.stack.pop()
+            if node.kind in COLLAPSIBLE and len(node.children) == 1:
+                node = node.children[0]
+            if self.stack:
+                self.stack[-1].addChild(node)
+            else:
+                self.tree = node
+        else:
+            self.stack.pop()
+
+
+    def getTree(self):
+        """
+        Get the abstract tree built from the events seen so far
+        @return the abstract tree of the outermost production that has finished, or None
+        """
+        return self.tree
+
+
+
+def abstractTree(tree):
+    """
+    Build the abstract tree of a concrete parse tree without recursion, with the same result
+    AbstractTreeBuilder gives for the events of the same parse
+    @param tree A concrete ParseTree (or Token)
+    @return the abstract tree
+    """
+    if isinstance(tree, Token):
+        return tree
+    # Abstract children of each interior node still being built, innermost last
+    built = []
+    stack = [(tree, False)]
+    while stack:
+        node, ready = stack.pop()
+        if not ready:
+            stack.append((node, True))
+            built.append([])
+            stack.extend((child, False) for child in reversed(node.children) if not isinstance(child, Token))
+            continue
+        kind = KINDS[node.node_type]
+        implied = IMPLIED_KEYWORDS.get(kind)
+        abstract_children = iter(built.pop())
+        children = []
+        for child in node.children:
+            if not isinstance(child, Token):
+                children.append(next(abstract_children))
+                continue
+            token_type = child.node_type
+            if token_type == "symbol":
+                symbol = child.value
+                if symbol in PUNCTUATION or (symbol == "=" and kind is NodeKind.LET_STATEMENT):
+                    continue
+            elif token_type == "keyword" and implied is not None and child.value in implied:
+                continue
+            children.append(child)
+        if kind in COLLAPSIBLE and len(children) == 1:
+            result = children[0]
+        else:
+            result = AbstractTree(kind)
+            result.children = children
+        if built:
+            built[-1].append(result)
+        else:
+            return result
+
+
+
+def parseAbstract(tokens, start="compileProgram"):
+    """
+    Parse a list of tokens into an abstract tree. The concrete tree is built on the parser's
+    fast path and then converted in one pass, which costs less than building through events.
+    @param tokens A list of tokens to be parsed
+    @param start Name of the CompilerParser compile method to start from
+    @return the abstract tree
+    """
+    return abstractTree(getattr(CompilerParser(tokens), start)())
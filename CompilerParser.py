@@ -1,14 +1,71 @@
+import functools
+
 from ParseTree import *
+from ParseEvents import ENTER, TOKEN, LEAVE, ABANDON, EventNode, iterEvents
+
+
+# Grammar tables, shared by every parser instance
+CLASS_VAR_KINDS = ("static", "field")
+SUBROUTINE_KINDS = ("method", "function", "constructor")
+VAR_TYPES = ("int", "char", "boolean")
+RETURN_TYPES = ("int", "char", "boolean", "void")
+STATEMENT_KEYWORDS = ("let", "if", "while", "do", "return")
+OP_SYMBOLS = ("+", "-", "*", "/", "&", "|", "<", ">", "=")
+KEYWORD_CONSTANTS = ("true", "false", "null", "this")
+UNARY_OPS = ("-", "~")
+
+
+def production(method):
+    """
+    Decorates a compile method that opens exactly one node.
+    While streaming events or enforcing a budget, the node is closed (with a leave event) when the
+    method returns, or abandoned (along with anything it left open) when the method raises.
+    """
+    @functools.wraps(method)
+    def compile(self):
+        if self.handler is None and self.budget is None:
+            return method(self)
+        depth = len(self.open_nodes)
+        if self.budget is not None:
+            self.budget.checkDepth(self, depth + 1)
+        try:
+            node = method(self)
+        except Exception:
+            self.abandonNodes(depth)
+            raise
+        self.closeNode(node)
+        return node
+    return compile
 
 
 class CompilerParser:
-    def __init__(self, tokens):
+    def __init__(self, tokens, handler=None, budget=None):
         """
         Constructor for the CompilerParser
         @param tokens A list of tokens to be parsed
+        @param handler Optional callable handler(event, value). When given, no tree is built and
+            the parser reports enter/token/leave/abandon events to it instead (see ParseEvents)
+        @param budget Optional ParseBudget limiting the work done; exceeding it raises BudgetExceeded
+        """
+        self.reset(tokens, handler, budget)
+
+    def reset(self, tokens, handler=None, budget=None):
+        """
+        Prepare this parser to parse a new list of tokens, discarding all state from the previous parse
+        @param tokens A list of tokens to be parsed
+        @param handler Optional event handler, as for the constructor
+        @param budget Optional ParseBudget, as for the constructor. Its clock starts now.
         """
         self.tokens = tokens
         self.current_token_index = 0
+        self.handler = handler
+        self.open_nodes = []
+        self.entered_nodes = 0
+        self.budget = budget
+        self.nodes_created = 0
+        self.deadline = budget.deadline() if budget is not None else None
+        # Errors the parser recovered from, as "production: message" strings in the order they happened
+        self.diagnostics = []
 
     def compileProgram(self):
         """
@@ -21,13 +78,14 @@ class CompilerParser:
         program_tree = self.compileClass()
         return program_tree
 
+    @production
     def compileClass(self):
         """
         Generates a parse tree for a single class
         @return a ParseTree that represents a class
         """
         ## Generate a parse tree
-        class_tree = ParseTree("class", " ")
+        class_tree = self.newNode("class")
         class_tree.addChild(self.mustBe("keyword", " class"))
         class_name = self.current().getValue()
         class_tree.addChild(self.mustBe("identifier", class_name))
@@ -50,19 +108,18 @@ class CompilerParser:
         class_tree.addChild(self.mustBe("symbol", "}"))
         return class_tree
 
+    @production
     def compileClassVarDec(self):
         """
         Generates a parse tree for a static variable declaration or field declaration
         @return a ParseTree that represents a static variable declaration or field declaration
         """
-        expected_values = ["static", "field"]
         # Generate parse tree
-        var_tree = ParseTree("classVarDec", " ")
+        var_tree = self.newNode("classVarDec")
         # static|field #
-        var_tree.addChild(self.mustBe("keyword", expected_values))
-        type_values = ["int", "char", "boolean"]
-        if self.have('keyword', type_values) is True:
-            var_tree.addChild(self.mustBe("keyword", type_values))
+        var_tree.addChild(self.mustBe("keyword", CLASS_VAR_KINDS))
+        if self.have('keyword', VAR_TYPES) is True:
+            var_tree.addChild(self.mustBe("keyword", VAR_TYPES))
         else:
             class_name = self.current().getValue()
             var_tree.addChild(self.mustBe("identifier", class_name))
@@ -81,21 +138,20 @@ class CompilerParser:
 
         return var_tree
 
+    @production
     def compileSubroutine(self):
         """
         Generates a parse tree for a method, function, or constructor
         @return a ParseTree that represents the method, function, or constructor
         """
         # Check that a subroutine is present
-        subroutine_values = ["method", "function", "constructor"]
         # Generate a parse tree for the subroutine
-        sub_tree = ParseTree("subroutine", " ")
+        sub_tree = self.newNode("subroutine")
          # constructor|function|method #
-        sub_tree.addChild(self.mustBe("keyword", subroutine_values))
+        sub_tree.addChild(self.mustBe("keyword", SUBROUTINE_KINDS))
 		# type: int, boolean, char, void, class_name #
-        type_values = ["int", "char", "boolean", "void"]
-        if self.have('keyword', type_values) is True:
-            sub_tree.addChild(self.mustBe("keyword", type_values))
+        if self.have('keyword', RETURN_TYPES) is True:
+            sub_tree.addChild(self.mustBe("keyword", RETURN_TYPES))
         else:
             class_name = self.current().getValue()
             sub_tree.addChild(self.mustBe("identifier", class_name))
@@ -116,22 +172,21 @@ class CompilerParser:
             pass
         return sub_tree
 
+    @production
     def compileParameterList(self):
         """
         Generates a parse tree for a subroutine's parameters
         @return a ParseTree that represents a subroutine's parameters
         """
-        param_tree = ParseTree("parameterList", " ")
+        param_tree = self.newNode("parameterList")
         while self.have("symbol", ")") is False:
-            type_values = ["int", "char", "boolean", "void"]
-            if self.have('keyword', type_values) is True:
-                param_tree.addChild(self.mustBe("keyword", type_values))
+            if self.have('keyword', RETURN_TYPES) is True:
+                param_tree.addChild(self.mustBe("keyword", RETURN_TYPES))
             else:
                 class_name = self.current().getValue()
                 param_tree.addChild(self.mustBe("identifier", class_name))
             param_name = self.current().getValue()
             param_tree.addChild(self.mustBe("identifier", param_name))
-            print(param_tree)
             try:
                 while self.have("symbol", ",") is True:
                         param_tree.addChild(self.mustBe("symbol", ","))
@@ -143,13 +198,14 @@ class CompilerParser:
                 break
         return param_tree
 
+    @production
     def compileSubroutineBody(self):
         """
         Generates a parse tree for a subroutine's body
         @return a ParseTree that represents a subroutine's body
         """
         
-        subbody_tree = ParseTree("subroutineBody", " ")
+        subbody_tree = self.newNode("subroutineBody")
         subbody_tree.addChild(self.mustBe("symbol", "{"))
         try:
           if self.have("keyword", "var"):
@@ -163,19 +219,19 @@ class CompilerParser:
         subbody_tree.addChild(self.mustBe("symbol", "}"))
         return subbody_tree
 
+    @production
     def compileVarDec(self):
         """
         Generates a parse tree for a variable declaration
         @return a ParseTree that represents a var declaration
         """
         # Generate parse tree
-        var_tree = ParseTree("varDec", " ")
+        var_tree = self.newNode("varDec")
         # static|field #
         var_tree.addChild(self.mustBe("keyword", "var"))
         # type: int, boolean, char, void, class_name #
-        type_values = ["int", "char", "boolean"]
-        if self.have('keyword', type_values) is True:
-            var_tree.addChild(self.mustBe("keyword", type_values))
+        if self.have('keyword', VAR_TYPES) is True:
+            var_tree.addChild(self.mustBe("keyword", VAR_TYPES))
         else:
             class_name = self.current().getValue()
             var_tree.addChild(self.mustBe("identifier", class_name))
@@ -187,13 +243,14 @@ class CompilerParser:
                 var_tree.addChild(self.mustBe("symbol", ","))
                 var_name = self.current().getValue()
                 var_tree.addChild(self.mustBe("identifier", var_name))
-        except ParseException:
-            print(f'Prase exception compileVarDec: {e}')
+        except ParseException as e:
+            self.diagnostics.append(f'compileVarDec: {e}')
         # ; #
         var_tree.addChild(self.mustBe("symbol", ";"))
 
         return var_tree
 
+    @production
     def compileStatements(self):
         """
         Generates a parse tree for a series of statements
@@ -201,10 +258,9 @@ class CompilerParser:
         
         
         """
-        statement_tree = ParseTree("statements", " ")
-        statement_values = ["let", "if", "while", "do", "return"]
+        statement_tree = self.newNode("statements")
         try:
-            while self.have("keyword", statement_values) is True:
+            while self.have("keyword", STATEMENT_KEYWORDS) is True:
                 if self.have("keyword", "let") is True:
                        statement_tree.addChild(self.compileLet())
                 elif self.have("keyword", "if") is True:
@@ -216,15 +272,16 @@ class CompilerParser:
                 elif self.have("keyword", "return") is True:
                      statement_tree.addChild(self.compileReturn())
         except ParseException as e:
-                    print(f'Prase exception compileStatements: {e}')
+                    self.diagnostics.append(f'compileStatements: {e}')
         return statement_tree
 
+    @production
     def compileLet(self):
         """
         Generates a parse tree for a let statement
         @return a ParseTree that represents the statement
         """
-        let_tree = ParseTree("letStatement", " ")
+        let_tree = self.newNode("letStatement")
         let_tree.addChild(self.mustBe("keyword","let"))
         var_name = self.current().getValue()
         let_tree.addChild(self.mustBe("identifier", var_name))
@@ -234,18 +291,19 @@ class CompilerParser:
                   let_tree.addChild(self.compileExpression())
                   let_tree.addChild(self.mustBe("symbol", "]"))
         except ParseException as e:
-                print(f'Prase exception compileLet: {e}')
+                self.diagnostics.append(f'compileLet: {e}')
         let_tree.addChild(self.mustBe("symbol", "="))
         let_tree.addChild(self.compileExpression())
         let_tree.addChild(self.mustBe("symbol", ";"))
         return let_tree
 
+    @production
     def compileIf(self):
         """
         Generates a parse tree for an if statement
         @return a ParseTree that represents the statement
         """
-        if_tree = ParseTree("ifStatement", " ")
+        if_tree = self.newNode("ifStatement")
         if_tree.addChild(self.mustBe("keyword","if"))
         if_tree.addChild(self.mustBe("symbol","("))
         if_tree.addChild(self.compileExpression())
@@ -260,15 +318,16 @@ class CompilerParser:
                 if_tree.addChild(self.compileStatements())
                 if_tree.addChild(self.mustBe("symbol","}"))
         except ParseException as e:
-                print(f'Prase exception compileIf: {e}')      
+                self.diagnostics.append(f'compileIf: {e}')
         return if_tree
 
+    @production
     def compileWhile(self):
         """
         Generates a parse tree for a while statement
         @return a ParseTree that represents the statement
         """
-        while_tree = ParseTree("whileStatement", " ")
+        while_tree = self.newNode("whileStatement")
         while_tree.addChild(self.mustBe("keyword","while"))
         while_tree.addChild(self.mustBe("symbol","("))
         while_tree.addChild(self.compileExpression())
@@ -278,66 +337,66 @@ class CompilerParser:
         while_tree.addChild(self.mustBe("symbol","}"))
         return while_tree
 
+    @production
     def compileDo(self):
         """
         Generates a parse tree for a do statement
         @return a ParseTree that represents the statement
         """
-        do_tree = ParseTree("doStatement", " ")
+        do_tree = self.newNode("doStatement")
         do_tree.addChild(self.mustBe("keyword","do"))
         do_tree.addChild(self.compileExpression())
         do_tree.addChild(self.mustBe("symbol", ";"))
         return do_tree
 
+    @production
     def compileReturn(self):
         """
         Generates a parse tree for a return statement
         @return a ParseTree that represents the statement
         """
-        return_tree = ParseTree("returnStatement", " ")
+        return_tree = self.newNode("returnStatement")
         return_tree.addChild(self.mustBe("keyword","return"))
         try:
             if self.have("symbol", ";") is False:
                  return_tree.addChild(self.compileExpression())
         except ParseException as e:
-                print(f'Prase exception compileReturn: {e}')
+                self.diagnostics.append(f'compileReturn: {e}')
         return_tree.addChild(self.mustBe("symbol", ";"))
         return return_tree
 
+    @production
     def compileExpression(self):
         """
         Generates a parse tree for an expression
         @return a ParseTree that represents the expression
         """
-        expression_tree = ParseTree("expression", " ")
+        expression_tree = self.newNode("expression")
         if self.have("keyword", "skip"):
             expression_tree.addChild(self.mustBe("keyword","skip"))
         else:
             expression_tree.addChild(self.compileTerm())
-            print(expression_tree)
-            op_symbols = ["+", "-", "*", "/", "&", "|", "<", ">", "="]
             try:
-                while self.have("symbol", op_symbols) is True:
-                     expression_tree.addChild(self.mustBe("symbol", op_symbols))
+                while self.have("symbol", OP_SYMBOLS) is True:
+                     expression_tree.addChild(self.mustBe("symbol", OP_SYMBOLS))
                      expression_tree.addChild(self.compileTerm())
             except ParseException as e:
-                    print(f'Prase exception compileExpression: {e}')
+                    self.diagnostics.append(f'compileExpression: {e}')
         return expression_tree
 
+    @production
     def compileTerm(self):
         """
         Generates a parse tree for an expression term
         @return a ParseTree that represents the expression term
         """
-        term_tree = ParseTree("term", " ")
-        keywordConstant = ["true", "false", "null", "this"]
-        unaryOp = ["-", "~"]
+        term_tree = self.newNode("term")
         current_token = self.current()
         if current_token.getType() == "integerConstant":
             term_tree.addChild(self.mustBe("integerConstant", current_token.getValue()))
         elif current_token.getType() == "stringConstant":
             term_tree.addChild(self.mustBe("stringConstant", current_token.getValue()))
-        elif self.have("keywordConstant", keywordConstant):
+        elif self.have("keywordConstant", KEYWORD_CONSTANTS):
             term_tree.addChild(self.mustBe("keyword", current_token.getValue()))
         elif current_token.getType() == "identifier":
             term_tree.addChild(self.mustBe("identifier", current_token.getValue()))
@@ -360,17 +419,18 @@ class CompilerParser:
             term_tree.addChild(self.mustBe("symbol", "("))
             term_tree.addChild(self.compileExpression())
             term_tree.addChild(self.mustBe("symbol", ")"))
-        elif self.have("symbol", unaryOp):
-            term_tree.addChild("sybmol", unaryOp)
+        elif self.have("symbol", UNARY_OPS):
+            term_tree.addChild(self.mustBe("symbol", UNARY_OPS))
             term_tree.addChild(self.compileTerm())
         return term_tree
 
+    @production
     def compileExpressionList(self):
         """
         Generates a parse tree for an expression list
         @return a ParseTree that represents the expression list
         """
-        expressionList_Tree = ParseTree("expressionList", " ")
+        expressionList_Tree = self.newNode("expressionList")
         Expression = self.compileExpression
         if Expression is not None:
             expressionList_Tree.addChild(self.compileExpression())
@@ -379,13 +439,98 @@ class CompilerParser:
                  expressionList_Tree.addChild(self.compileExpression())
         return expressionList_Tree
 
+    def events(self, start="compileProgram"):
+        """
+        Parse the tokens without building a tree, yielding parse events as they happen
+        @param start Name of the compile method to start from
+        @return a generator of (event, value) pairs
+        """
+        return iterEvents(self, start)
+
+    def newNode(self, node_type):
+        """
+        Open a node for the production being compiled
+        @param node_type The type of node (see element types).
+        @return a ParseTree, or an EventNode while streaming events
+        """
+        if self.handler is None:
+            node = ParseTree(node_type, " ")
+            if self.budget is None:
+                return node
+        else:
+            node = EventNode(self, node_type)
+        if self.budget is not None:
+            self.budget.checkNode(self)
+        self.open_nodes.append(node)
+        return node
+
+    def enterNodes(self):
+        """
+        Report enter events for open nodes that have not been announced yet.
+        Entering lazily means a production that fails before consuming anything produces no events.
+        """
+        while self.entered_nodes < len(self.open_nodes):
+            self.handler(ENTER, self.open_nodes[self.entered_nodes].node_type)
+            self.entered_nodes += 1
+
+    def emitToken(self, token):
+        """
+        Report a token consumed by the innermost open node
+        @param token The Token that was added
+        """
+        self.enterNodes()
+        self.handler(TOKEN, token)
+
+    def closeNode(self, node):
+        """
+        Report that the innermost open node is complete
+        @param node The node being closed
+        """
+        if self.handler is None:
+            self.open_nodes.pop()
+            return
+        self.enterNodes()
+        self.open_nodes.pop()
+        self.entered_nodes -= 1
+        self.handler(LEAVE, node.node_type)
+
+    def abandonNodes(self, depth):
+        """
+        Drop open nodes above the given depth after a production failed,
+        reporting abandon events for the ones that had been entered
+        @param depth Number of open nodes to keep
+        """
+        if self.handler is None:
+            del self.open_nodes[depth:]
+            return
+        while len(self.open_nodes) > depth:
+            node = self.open_nodes.pop()
+            if len(self.open_nodes) < self.entered_nodes:
+                self.entered_nodes -= 1
+                self.handler(ABANDON, node.node_type)
+
     def next(self):
         """
         Advance to the next token
         """
         self.current_token_index += 1
+        if self.budget is not None:
+            self.budget.checkToken(self)
         return
 
+    def exceedBudget(self, reason):
+        """
+        Stop parsing because the budget ran out, raising BudgetExceeded with the tree built so far
+        @param reason Which limit was exceeded
+        """
+        partial = None
+        if self.handler is None and self.open_nodes:
+            # Hang each unfinished production off the one that was compiling it
+            for parent, child in zip(self.open_nodes, self.open_nodes[1:]):
+                parent.addChild(child)
+            partial = self.open_nodes[0]
+        raise BudgetExceeded(reason, partial, self.current_token_index)
+
     def current(self):
         """
         Return the current token
@@ -403,15 +548,11 @@ class CompilerParser:
         @return True if a match, False otherwise
         """
         current_token = self.current()
-        if (
-            current_token.getType() == expectedType
-            and current_token.getValue() == expectedValue
-        ):
+        token_type = current_token.getType()
+        token_value = current_token.getValue()
+        if token_type == expectedType and token_value == expectedValue:
             return True
-        elif (
-            current_token.getType() in expectedType
-            and current_token.getValue() in expectedValue
-        ):
+        elif token_type in expectedType and token_value in expectedValue:
             return True
         return False
 
@@ -0,0 +1,219 @@
+from ParseTree import *
+
+
+# Jack integers are 16-bit two's complement
+MIN_INTEGER = -32768
+MAX_INTEGER = 32767
+
+TRUE = -1
+FALSE = 0
+
+COMPARISONS = ("<", ">", "=")
+
+
+class FoldReport():
+
+    def __init__(self, nodes_before):
+        """
+        What foldConstants() did to a tree
+        @param nodes_before Number of nodes before folding
+        """
+        self.nodes_before = nodes_before
+        self.nodes_after = nodes_before
+        self.folded = 0
+        self.collapsed = 0
+
+
+    def reduction(self):
+        """
+        @return the fraction of nodes removed
+        """
+        return 1 - self.nodes_after / self.nodes_before if self.nodes_before else 0.0
+
+
+    def __str__(self):
+        return (
+            f"{self.nodes_before} -> {self.nodes_after} nodes ({self.reduction():.1%} fewer), "
+            f"{self.folded} constant(s) folded, {self.collapsed} parenthesised term(s) collapsed"
+        )
+
+
+
+def wrap(value):
+    """
+    @return the value wrapped to a 16-bit signed integer
+    """
+    return (value - MIN_INTEGER) % 0x10000 + MIN_INTEGER
+
+
+def evaluate(left, op, right):
+    """
+    Apply a binary operator the way the Jack VM does
+    @param left The (value, boolean) left operand
+    @param op The operator symbol
+    @param right The (value, boolean) right operand
+    @return the (value, boolean) result, or None if it can't be computed (division by zero)
+    """
+    a, a_boolean = left
+    b, b_boolean = right
+    if op == "+":
+        return wrap(a + b), False
+    if op == "-":
+        return wrap(a - b), False
+    if op == "*":
+        return wrap(a * b), False
+    if op == "/":
+        if b == 0:
+            return None
+        quotient = abs(a) // abs(b)
+        return wrap(quotient if (a < 0) == (b < 0) else -quotient), False
+    if op == "&":
+        return a & b, a_boolean and b_boolean
+    if op == "|":
+        return a | b, a_boolean and b_boolean
+    if op == "<":
+        return (TRUE if a < b else FALSE), True
+    if op == ">":
+        return (TRUE if a > b else FALSE), True
+    return (TRUE if a == b else FALSE), True
+
+
+def constantValue(term):
+    """
+    Get the value of a term that is a constant, after its own subterms have been folded
+    @param term A term ParseTree
+    @return (value, boolean) where boolean is True for true/false and comparisons, or None if not constant
+    """
+    children = term.getChildren()
+    if len(children) == 1:
+        child = children[0]
+        child_type = child.getType()
+        if child_type == "integerConstant":
+            return int(child.getValue()), False
+        if child_type == "keyword" and child.getValue() == "true":
+            return TRUE, True
+        if child_type == "keyword" and child.getValue() == "false":
+            return FALSE, True
+    elif len(children) == 2 and isinstance(children[0], Token) and children[0].getType() == "symbol":
+        operand = constantValue(children[1])
+        if operand is not None:
+            value, boolean = operand
+            if children[0].getValue() == "-":
+                return wrap(-value), False
+            return ~value, boolean
+    return None
+
+
+def constantChildren(value, boolean):
+    """
+    Build the children of a term holding a constant. Jack has no negative literals,
+    so negative values become a unary minus (or ~32767 for -32768).
+    @param value The 16-bit value
+    @param boolean True to write -1 and 0 as true and false
+    @return a list of child nodes for the term
+    """
+    if boolean and value in (TRUE, FALSE):
+        return [Token("keyword", "true" if value == TRUE else "false")]
+    if value >= 0:
+        return [Token("integerConstant", str(value))]
+    operand = ParseTree("term", " ")
+    if value == MIN_INTEGER:
+        operand.children = [Token("integerConstant", str(MAX_INTEGER))]
+        return [Token("symbol", "~"), operand]
+    operand.children = [Token("integerConstant", str(-value))]
+    return [Token("symbol", "-"), operand]
+
+
+def innerTerm(node):
+    """
+    @param node A term or expression ParseTree
+    @return the single term inside a parenthesised term, or None if the node isn't ( term )
+    """
+    children = node.getChildren()
+    if len(children) != 3 or not isinstance(children[0], Token) or children[0].getValue() != "(":
+        return None
+    inner = children[1].getChildren()
+    if len(inner) != 1 or isinstance(inner[0], Token):
+        return None
+    return inner[0]
+
+
+def foldTerm(term, report):
+    """
+    Simplify a term whose subterms are already folded: collapse ( term ) and fold unary operators on constants
+    @param term The term ParseTree, changed in place
+    @param report The FoldReport to update
+    """
+    inner = innerTerm(term)
+    if inner is not None:
+        term.children = inner.children
+        report.collapsed += 1
+    children = term.getChildren()
+    if len(children) == 2 and isinstance(children[0], Token) and children[0].getType() == "symbol":
+        constant = constantValue(term)
+        if constant is not None:
+            folded = constantChildren(*constant)
+            if len(folded) != 2 or folded[0].getValue() != children[0].getValue():
+                term.children = folded
+                report.folded += 1
+
+
+def foldExpression(expression, report):
+    """
+    Fold the leading run of constant terms of an expression whose terms are already folded.
+    Jack applies operators strictly left to right, so only a constant prefix can be folded.
+    @param expression The expression ParseTree, changed in place
+    @param report The FoldReport to update
+    """
+    children = expression.getChildren()
+    if len(children) >= 3:
+        result = constantValue(children[0])
+        end = 1
+        while result is not None and end + 1 < len(children):
+            right = constantValue(children[end + 1])
+            if right is None:
+                break
+            value = evaluate(result, children[end].getValue(), right)
+            if value is None:
+                break
+            result = value
+            end += 2
+        if end > 1:
+            term = ParseTree("term", " ")
+            term.children = constantChildren(*result)
+            expression.children = [term] + children[end:]
+            report.folded += 1
+    # An expression that is just ( expression ) takes the inner expression's children
+    children = expression.getChildren()
+    if len(children) == 1 and not isinstance(children[0], Token):
+        inner = children[0].getChildren()
+        if len(inner) == 3 and isinstance(inner[0], Token) and inner[0].getValue() == "(":
+            expression.children = inner[1].getChildren()
+            report.collapsed += 1
+
+
+def foldConstants(tree):
+    """
+    Fold integer and boolean constant expressions and collapse trivially parenthesised terms, in place.
+    Arithmetic wraps to 16 bits as in the Jack VM, true is -1 and false is 0, and division by zero
+    is left for run time.
+    @param tree The root of the tree, e.g. from compileProgram()
+    @return a FoldReport with the node reduction
+    """
+    report = FoldReport(countNodes(tree))
+    stack = [(tree, False)]
+    while stack:
+        node, visited = stack.pop()
+        if visited:
+            node_type = node.getType()
+            if node_type == "term":
+                foldTerm(node, report)
+            elif node_type == "expression":
+                foldExpression(node, report)
+        elif not isinstance(node, Token) and node.getChildren():
+            stack.append((node, True))
+            stack.extend((child, False) for child in node.getChildren())
+    report.nodes_after = countNodes(tree)
+    if report.folded or report.collapsed:
+        tree.clearHashes()
+    return report
@@ -0,0 +1,178 @@
+import re
+import sys
+
+from ParseTree import *
+from SourceTokens import SourceBuffer
+
+
+KEYWORDS = frozenset([
+    "class", "constructor", "function", "method", "field", "static", "var", "int", "char",
+    "boolean", "void", "true", "false", "null", "this", "let", "do", "if", "else", "while",
+    "return", "skip",
+])
+
+SYMBOLS = frozenset(b"{}()[].,;+-*/&|<>=~")
+
+WHITESPACE = frozenset(b" \t\r\n\f\v")
+
+DIGITS = frozenset(b"0123456789")
+
+IDENTIFIER_START = frozenset(b"abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_")
+
+IDENTIFIER_PART = IDENTIFIER_START | DIGITS
+
+MAX_INTEGER = 32767
+
+SLASH = ord("/")
+STAR = ord("*")
+QUOTE = ord('"')
+NEWLINE = ord("\n")
+
+# Every lexical element of Jack in one pattern. Each match skips any whitespace and comments, then
+# takes one token; the name of the group that matched is the token type.
+MASTER_PATTERN = re.compile(
+    rb"""
+    (?:\s+|//[^\n]*|/\*.*?\*/)*
+    (?:
+      (?P<symbol>[{}()\[\].,;+\-*&|<>=~]|/(?![/*]))
+    | (?P<keyword>(?:%s)(?![A-Za-z0-9_]))
+    | (?P<identifier>[A-Za-z_][A-Za-z0-9_]*)
+    | (?P<integerConstant>[0-9]+)
+    | "(?P<stringConstant>[^"\n]*)"
+    | (?P<end>\Z)
+    | (?P<unterminated>/\*|")
+    | (?P<unexpected>.)
+    )
+    """ % b"|".join(sorted((keyword.encode() for keyword in KEYWORDS), key=len, reverse=True)),
+    re.VERBOSE | re.DOTALL,
+)
+
+# Token type of each group of MASTER_PATTERN, by group number
+GROUP_TYPES = (None,) + tuple(sorted(MASTER_PATTERN.groupindex, key=MASTER_PATTERN.groupindex.get))
+
+# Groups numbered above this one are not tokens
+LAST_TOKEN_GROUP = MASTER_PATTERN.groupindex["stringConstant"]
+
+INTEGER_GROUP = MASTER_PATTERN.groupindex["integerConstant"]
+
+
+class JackTokenizer():
+
+    def __init__(self, source):
+        """
+        Splits Jack source into the tokens CompilerParser expects
+        @param source A SourceBuffer, or the source as bytes or str
+        """
+        if isinstance(source, str):
+            source = source.encode("utf-8")
+        if not isinstance(source, SourceBuffer):
+            source = SourceBuffer(source)
+        self.source = source
+
+
+    @staticmethod
+    def fromFile(path):
+        """
+        Create a tokenizer for a .jack file, mapping it into memory
+        @param path Path of the file
+        @return a JackTokenizer
+        """
+        return JackTokenizer(SourceBuffer.fromFile(path))
+
+
+    def error(self, message, offset):
+        """
+        Raise a ParseException pointing at a position in the source
+        @param message What went wrong
+        @param offset Byte offset of the problem
+        """
+        line = self.source.data[:offset].count(b"\n") + 1
+        raise ParseException(f"Line {line}: {message}")
+
+
+    def tokenize(self):
+        """
+        Tokenize the whole source with a single precompiled pattern
+        @return a list of Tokens, with equal values sharing one str
+        """
+        source = self.source
+        tokens = []
+        append = tokens.append
+        types = GROUP_TYPES
+        interned = source.interned
+        for match in MASTER_PATTERN.finditer(source.data):
+            group = match.lastindex
+            start, end = match.span(group)
+            if group > LAST_TOKEN_GROUP:
+                token_type = types[group]
+                if token_type == "end":
+                    break
+                if token_type == "unterminated":
+                    what = "comment" if source.data[start] == SLASH else "string constant"
+                    self.error(f"unterminated {what}", start)
+                self.error(f"unexpected character {chr(source.data[start])!r}", start)
+            if group == INTEGER_GROUP and end - start >= 5 and int(source.data[start:end]) > MAX_INTEGER:
+                self.error(f"integer constant larger than {MAX_INTEGER}", start)
+            raw = match.group(group)
+            text = interned.get(raw)
+            if text is None:
+                text = interned[raw] = sys.intern(str(raw, "utf-8"))
+            append(Token(types[group], text))
+        return tokens
+
+
+    def tokenizeByCharacter(self):
+        """
+        Tokenize the whole source one character at a time. Slower than tokenize(), which
+        must produce the same tokens; kept as the baseline for benchmarks.
+        @return a list of Tokens
+        """
+        source = self.source
+        data = source.data
+        length = len(data)
+        tokens = []
+        index = 0
+        while index < length:
+            char = data[index]
+            if char in WHITESPACE:
+                index += 1
+            elif char == SLASH and index + 1 < length and data[index + 1] == SLASH:
+                while index < length and data[index] != NEWLINE:
+                    index += 1
+            elif char == SLASH and index + 1 < length and data[index + 1] == STAR:
+                start = index
+                index += 2
+                while index + 1 < length and not (data[index] == STAR and data[index + 1] == SLASH):
+                    index += 1
+                if index + 1 >= length:
+                    self.error("unterminated comment", start)
+                index += 2
+            elif char in SYMBOLS:
+                tokens.append(source.token("symbol", index, 1))
+                index += 1
+            elif char in DIGITS:
+                start = index
+                while index < length and data[index] in DIGITS:
+                    index += 1
+                if int(data[start:index]) > MAX_INTEGER:
+                    self.error(f"integer constant larger than {MAX_INTEGER}", start)
+                tokens.append(source.token("integerConstant", start, index - start))
+            elif char == QUOTE:
+                start = index + 1
+                index = start
+                while index < length and data[index] != QUOTE and data[index] != NEWLINE:
+                    index += 1
+                if index >= length or data[index] != QUOTE:
+                    self.error("unterminated string constant", start - 1)
+                tokens.append(source.token("stringConstant", start, index - start))
+                index += 1
+            elif char in IDENTIFIER_START:
+                start = index
+                while index < length and data[index] in IDENTIFIER_PART:
+                    index += 1
+                word = source.internedText(start, index - start)
+                token_type = "keyword" if word in KEYWORDS else "identifier"
+                tokens.append(source.token(token_type, start, index - start))
+            else:
+                self.error(f"unexpected character {chr(char)!r}", index)
+        return tokens
@@ -0,0 +1,199 @@
+import argparse
+import hashlib
+import os
+import time
+
+from ParseTree import *
+from CompilerParser import CompilerParser
+from JackTokenizer import JackTokenizer
+
+
+def contentHash(data):
+    """
+    @param data File contents as bytes
+    @return a short digest identifying the contents
+    """
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def fingerprintFile(path, mtime_ns=None, size=None, digest=None):
+    """
+    Check a file against what was known about it last time. It is only read when its mtime or size
+    changed, and only counts as changed when its content hash did.
+    @param path Path of the file
+    @param mtime_ns Modification time when last checked, or None if the file is new
+    @param size Size in bytes when last checked
+    @param digest Content hash from contentHash() when last read
+    @return (stat, digest, data) where data is the file contents if they changed, or None if they didn't,
+        including when the file was touched but not edited
+    @throws FileNotFoundError if the file is gone
+    """
+    stat = os.stat(path)
+    if stat.st_mtime_ns == mtime_ns and stat.st_size == size:
+        return stat, digest, None
+    with open(path, "rb") as file:
+        data = file.read()
+    new_digest = contentHash(data)
+    if new_digest == digest:
+        return stat, digest, None
+    return stat, new_digest, data
+
+
+def parseSource(data, budget=None):
+    """
+    Tokenize and parse the contents of one .jack file, collecting problems instead of raising them
+    @param data File contents as bytes
+    @param budget Optional ParseBudget for the parse
+    @return (tree, diagnostics) where tree is None if parsing failed
+    """
+    try:
+        tokens = JackTokenizer(data).tokenize()
+    except ParseException as e:
+        return None, [str(e)]
+    return parseTokens(tokens, budget)
+
+
+def parseTokens(tokens, budget=None):
+    """
+    Parse the tokens of one class, collecting problems instead of raising them
+    @param tokens A list of tokens
+    @param budget Optional ParseBudget for the parse
+    @return (tree, diagnostics) where tree is None if parsing failed
+    """
+    tree = None
+    parser = CompilerParser(tokens, budget=budget)
+    # Errors the parser recovered from come first
+    diagnostics = parser.diagnostics
+    try:
+        tree = parser.compileProgram()
+        if parser.current_token_index < len(tokens):
+            leftover = tokens[parser.current_token_index]
+            diagnostics.append(f"Unexpected {leftover.getType()} {leftover.getValue()!r} after the class")
+    except (ParseException, BudgetExceeded) as e:
+        diagnostics.append(str(e))
+    return tree, diagnostics
+
+
+class FileState():
+
+    def __init__(self, path, mtime_ns, size, digest):
+        """
+        What the watcher knows about one source file
+        @param path Path of the file
+        @param mtime_ns Modification time when last checked
+        @param size Size in bytes when last checked
+        @param digest Content hash when last parsed
+        """
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.digest = digest
+        self.tree = None
+        self.diagnostics = []
+
+
+
+class ProjectWatcher():
+
+    def __init__(self, root, budget=None):
+        """
+        Keeps parse trees for every .jack file under a directory, reparsing only files whose contents
+        change (see fingerprintFile).
+        @param root Directory to watch
+        @param budget Optional ParseBudget applied to each parse
+        """
+        self.root = root
+        self.budget = budget
+        self.files = {}
+
+
+    def sources(self):
+        """
+        @return the paths of all .jack files under the root, sorted
+        """
+        paths = []
+        for directory, subdirectories, names in os.walk(self.root):
+            subdirectories.sort()
+            paths.extend(os.path.join(directory, name) for name in names if name.endswith(".jack"))
+        return sorted(paths)
+
+
+    def scan(self):
+        """
+        Check every source file once and reparse the ones whose contents changed
+        @return (changed, removed) lists of paths
+        """
+        changed = []
+        seen = set()
+        for path in self.sources():
+            state = self.files.get(path)
+            try:
+                if state is None:
+                    stat, digest, data = fingerprintFile(path)
+                else:
+                    stat, digest, data = fingerprintFile(path, state.mtime_ns, state.size, state.digest)
+            except FileNotFoundError:
+                continue
+            seen.add(path)
+            if data is None:
+                state.mtime_ns = stat.st_mtime_ns
+                state.size = stat.st_size
+                continue
+            state = FileState(path, stat.st_mtime_ns, stat.st_size, digest)
+            state.tree, state.diagnostics = parseSource(data, self.budget)
+            self.files[path] = state
+            changed.append(path)
+        removed = [path for path in self.files if path not in seen]
+        for path in removed:
+            del self.files[path]
+        return changed, removed
+
+
+    def watch(self, interval=1.0, report=None):
+        """
+        Poll the directory until interrupted, reporting each batch of changes
+        @param interval Seconds between scans
+        @param report Callable report(watcher, changed, removed); printReport by default
+        """
+        report = report or printReport
+        while True:
+            changed, removed = self.scan()
+            if changed or removed:
+                report(self, changed, removed)
+            time.sleep(interval)
+
+
+
+def printReport(watcher, changed, removed, show_trees=False):
+    """
+    Print the outcome of a scan
+    @param watcher The ProjectWatcher that scanned
+    @param changed Paths that were reparsed
+    @param removed Paths that disappeared
+    @param show_trees Print the parse tree of each changed file too
+    """
+    print(time.strftime("[%H:%M:%S]"), f"{len(changed)} changed, {len(removed)} removed, {len(watcher.files)} files")
+    for path in removed:
+        print(f"  - {path}")
+    for path in changed:
+        state = watcher.files[path]
+        status = "ok" if state.tree is not None and not state.diagnostics else f"{len(state.diagnostics)} problem(s)"
+        print(f"  * {path}: {status}")
+        for diagnostic in state.diagnostics:
+            print(f"      {diagnostic}")
+        if show_trees and state.tree is not None:
+            print(state.tree)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reparse .jack files as they change")
+    parser.add_argument("root", nargs="?", default=".", help="directory to watch")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between scans")
+    parser.add_argument("--trees", action="store_true", help="print the parse tree of each changed file")
+    args = parser.parse_args()
+
+    watcher = ProjectWatcher(args.root)
+    try:
+        watcher.watch(args.interval, lambda watcher, changed, removed: printReport(watcher, changed, removed, args.trees))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,234 @@
+import concurrent.futures
+import gc
+import os
+
+from ParseTree import *
+from CompilerParser import CompilerParser, SUBROUTINE_KINDS
+
+
+# Token values splitSubroutines() looks at: braces and the keywords that start a subroutine
+SPLIT_VALUES = frozenset(("{", "}") + SUBROUTINE_KINDS)
+
+
+def splitSubroutines(tokens):
+    """
+    Find subroutine boundaries in the tokens of a class with a brace-depth scan, without parsing.
+    @param tokens A list of tokens for a single class
+    @return (ranges, close) where ranges holds a (start, end) token range per subroutine and
+        close is the index of the class's closing brace, or None if the tokens don't look like a class
+    """
+    depth = 0
+    starts = []
+    close = None
+    for index, token in enumerate(tokens):
+        # Compare values first: they are shared strs, and most tokens are none of these
+        value = token.value
+        if value not in SPLIT_VALUES:
+            continue
+        token_type = token.node_type
+        if token_type == "symbol":
+            if value == "{":
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    close = index
+                    break
+                if depth < 0:
+                    return None
+        elif depth == 1 and token_type == "keyword":
+            starts.append(index)
+    if close is None or close != len(tokens) - 1:
+        return None
+    ranges = [(start, end) for start, end in zip(starts, starts[1:] + [close])]
+    return ranges, close
+
+
+def encodeTree(tree, values):
+    """
+    Flatten a tree into compact preorder lists that are cheap to send between processes.
+    Token values aren't sent back at all: a tree that used every token of its chunk holds them in
+    input order, so the receiver can take them from its own copy of the chunk.
+    @param tree The ParseTree to flatten
+    @param values The values of the chunk of tokens the tree was parsed from
+    @return (types, counts) as from flattenTree(), or None if the tree doesn't hold exactly the
+        chunk's tokens in order
+    """
+    types, tree_values, counts = flattenTree(tree)
+    if [value for value, count in zip(tree_values, counts) if count < 0] != values:
+        return None
+    return types, counts
+
+
+def decodeTree(encoded, tokens):
+    """
+    Rebuild a tree flattened by encodeTree(), reusing the original Token objects
+    @param encoded The (types, counts) lists
+    @param tokens The chunk of tokens the tree was parsed from
+    @return the ParseTree
+    """
+    chunk = iter(tokens)
+    return buildPreorder(
+        (next(chunk), 0) if count < 0 else (ParseTree(node_type, " "), count)
+        for node_type, count in zip(*encoded)
+    )
+
+
+class LazySubtree(ParseTree):
+
+    """
+    A subroutine parsed by a worker, kept in its encoded form until its children are first asked for,
+    so attaching worker results costs the parent one node per subroutine instead of a full rebuild
+    """
+    __slots__ = ("encoded", "tokens", "decoded")
+
+    def __init__(self, encoded, tokens):
+        """
+        @param encoded The subroutine's tree as flattened by encodeTree()
+        @param tokens The chunk of tokens the tree was parsed from
+        """
+        self.node_type = encoded[0][0]
+        self.value = " "
+        self.structural_hash = None
+        self.encoded = encoded
+        self.tokens = tokens
+        self.decoded = None
+
+
+    def getChildren(self):
+        """
+        Get a list of child nodes in the order they were added, decoding them on first use
+        @return A list of ParseTrees
+        """
+        if self.decoded is None:
+            # Rebuilding is pure allocation of acyclic nodes, so don't let the cycle collector rescan them
+            collecting = gc.isenabled()
+            gc.disable()
+            try:
+                self.decoded = decodeTree(self.encoded, self.tokens).children
+            finally:
+                if collecting:
+                    gc.enable()
+            self.encoded = None
+            self.tokens = None
+        return self.decoded
+
+
+    @property
+    def children(self):
+        return self.getChildren()
+
+
+    @children.setter
+    def children(self, children):
+        self.decoded = children
+        self.encoded = None
+        self.tokens = None
+
+
+    def addChild(self, child):
+        """
+        Adds a ParseTree as a child of this ParseTree
+        @param child The ParseTree to add
+        """
+        self.getChildren().append(child)
+        self.structural_hash = None
+
+
+
+def parseSubroutines(types, values, lengths):
+    """
+    Parse a batch of consecutive subroutines. Runs in a worker process.
+    @param types Token types of the whole batch
+    @param values Token values of the whole batch
+    @param lengths Number of tokens in each subroutine
+    @return a list of (encoded tree, diagnostics) per subroutine, with None for the tree of any
+        chunk that didn't parse to its end
+    """
+    results = []
+    # Parsing is pure allocation of acyclic nodes, so don't let the cycle collector rescan them
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        tokens = list(map(Token, types, values))
+        parser = CompilerParser([])
+        position = 0
+        for length in lengths:
+            chunk = tokens[position:position + length]
+            chunk_values = values[position:position + length]
+            position += length
+            parser.reset(chunk)
+            try:
+                tree = parser.compileSubroutine()
+            except ParseException:
+                tree = None
+            if tree is None or parser.current_token_index != len(chunk):
+                results.append((None, parser.diagnostics))
+            else:
+                results.append((encodeTree(tree, chunk_values), parser.diagnostics))
+    finally:
+        if collecting:
+            gc.enable()
+    return results
+
+
+def compileProgramParallel(tokens, workers=None, min_subroutines=64, executor=None):
+    """
+    Generates a parse tree for a single program, parsing its subroutines concurrently in worker processes.
+    Falls back to an ordinary serial parse for small classes and for input the split can't handle,
+    so the result is always the tree compileProgram() would produce. Subroutines parsed by workers
+    are attached as LazySubtrees and only rebuilt when something walks into them.
+    @param tokens A list of tokens to be parsed
+    @param workers Number of worker processes (defaults to the CPU count)
+    @param min_subroutines Classes with fewer subroutines are parsed serially
+    @param executor Optional existing process pool to reuse across calls
+    @return (tree, diagnostics) with the errors the parser recovered from in source order
+    """
+    split = splitSubroutines(tokens)
+    if split is None or len(split[0]) < min_subroutines:
+        return compileSerial(tokens)
+    ranges, close = split
+
+    # Class header, field declarations and closing brace, with the subroutines cut out
+    header = CompilerParser(tokens[:ranges[0][0]] + [tokens[close]])
+    class_tree = header.compileProgram()
+
+    # Each batch is a run of consecutive subroutines, sent as two flat lists; pickling shares
+    # repeated type and value strings, so this is far smaller than a tuple per token
+    workers = workers or os.cpu_count() or 1
+    batch = max(1, len(ranges) // (workers * 4))
+    batches = []
+    for first in range(0, len(ranges), batch):
+        group = ranges[first:first + batch]
+        chunk = tokens[group[0][0]:group[-1][1]]
+        batches.append((
+            [token.node_type for token in chunk],
+            [token.value for token in chunk],
+            [end - start for start, end in group],
+        ))
+    if executor is None:
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(parseSubroutines, *zip(*batches)))
+    else:
+        results = list(executor.map(parseSubroutines, *zip(*batches)))
+
+    results = [result for batch_results in results for result in batch_results]
+    if any(encoded is None for encoded, diagnostics in results):
+        return compileSerial(tokens)
+    closing = class_tree.children.pop()
+    for (start, end), (encoded, diagnostics) in zip(ranges, results):
+        class_tree.children.append(LazySubtree(encoded, tokens[start:end]))
+    class_tree.addChild(closing)
+    diagnostics = header.diagnostics + [
+        diagnostic for encoded, subroutine_diagnostics in results for diagnostic in subroutine_diagnostics
+    ]
+    return class_tree, diagnostics
+
+
+def compileSerial(tokens):
+    """
+    Parse a program in this process
+    @return (tree, diagnostics) as for compileProgramParallel()
+    """
+    parser = CompilerParser(tokens)
+    return parser.compileProgram(), parser.diagnostics
@@ -0,0 +1,91 @@
+import time
+
+
+class CancellationToken():
+
+    def __init__(self):
+        """
+        Lets another thread stop a running parse. Share one token between the caller and the ParseBudget.
+        """
+        self.cancelled = False
+
+
+    def cancel(self):
+        """
+        Ask every parse using this token to stop at its next token
+        """
+        self.cancelled = True
+
+
+    def isCancelled(self):
+        """
+        @return True once cancel() has been called
+        """
+        return self.cancelled
+
+
+
+class ParseBudget():
+
+    # The clock is only read every this many tokens
+    CLOCK_INTERVAL = 64
+
+    def __init__(self, max_tokens=None, max_depth=None, max_nodes=None, time_limit=None, cancellation=None):
+        """
+        Limits on the work a single parse may do. Any limit left as None is not enforced.
+        One budget can be shared by many parsers; each parse is measured separately.
+        @param max_tokens Maximum number of tokens consumed
+        @param max_depth Maximum nesting depth of productions
+        @param max_nodes Maximum number of tree nodes created, not counting tokens
+        @param time_limit Maximum wall-clock seconds, measured from when the parser is reset
+        @param cancellation Optional CancellationToken checked on every token
+        """
+        self.max_tokens = max_tokens
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.time_limit = time_limit
+        self.cancellation = cancellation
+
+
+    def deadline(self):
+        """
+        @return the monotonic clock time at which a parse starting now runs out of time, or None
+        """
+        if self.time_limit is None:
+            return None
+        return time.monotonic() + self.time_limit
+
+
+    def checkToken(self, parser):
+        """
+        Called each time the parser advances to the next token
+        @param parser The CompilerParser being measured
+        """
+        consumed = parser.current_token_index
+        if self.max_tokens is not None and consumed > self.max_tokens:
+            parser.exceedBudget(f"more than {self.max_tokens} tokens")
+        if self.cancellation is not None and self.cancellation.cancelled:
+            parser.exceedBudget("cancelled")
+        if parser.deadline is not None and consumed % self.CLOCK_INTERVAL == 0:
+            if time.monotonic() > parser.deadline:
+                parser.exceedBudget(f"took longer than {self.time_limit} seconds")
+
+
+    def checkDepth(self, parser, depth):
+        """
+        Called before the parser opens a production
+        @param parser The CompilerParser being measured
+        @param depth Nesting depth the new production would have
+        """
+        if self.max_depth is not None and depth > self.max_depth:
+            parser.exceedBudget(f"nesting deeper than {self.max_depth}")
+
+
+    def checkNode(self, parser):
+        """
+        Called each time the parser creates a tree node
+        @param parser The CompilerParser being measured
+        """
+        parser.nodes_created += 1
+        if self.max_nodes is not None and parser.nodes_created > self.max_nodes:
+            parser.exceedBudget(f"more than {self.max_nodes} nodes")
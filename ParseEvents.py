@@ -0,0 +1,155 @@
+import queue
+import threading
+
+from ParseTree import *
+
+
+# Event names passed to a parse event handler as handler(event, value)
+ENTER = "enter"      # value is the node type of a production that has started
+TOKEN = "token"      # value is the Token consumed by the innermost open production
+LEAVE = "leave"      # value is the node type of a production that has finished
+ABANDON = "abandon"  # value is the node type of a production that failed part way through
+
+
+class EventNode():
+
+    def __init__(self, parser, node_type):
+        """
+        Stand-in for a ParseTree node while a CompilerParser is streaming events.
+        Tokens added to it are forwarded to the parser's handler and nothing is kept.
+        @param parser The CompilerParser that owns the node
+        @param node_type The type of node (see element types).
+        """
+        self.parser = parser
+        self.node_type = node_type
+
+
+    def addChild(self, child):
+        """
+        Forwards a Token to the event handler. Child productions report themselves, so they are ignored.
+        @param child The Token or EventNode to add
+        """
+        if not isinstance(child, EventNode):
+            self.parser.emitToken(child)
+
+
+    def getType(self):
+        """
+        Get the type of this node
+        @return The type of node (see element types).
+        """
+        return self.node_type
+
+
+    def __str__(self):
+        return self.node_type + " (streamed)\n"
+
+
+
+class TreeBuilder():
+
+    def __init__(self):
+        """
+        Event handler that rebuilds the same ParseTree the parser builds by default.
+        Pass an instance as the handler of a CompilerParser, then call getTree().
+        """
+        self.stack = []
+        self.tree = None
+
+
+    def __call__(self, event, value):
+        """
+        Handle a single parse event
+        @param event One of ENTER, TOKEN, LEAVE or ABANDON
+        @param value The node type, or the Token for TOKEN events
+        """
+        if event == TOKEN:
+            self.stack[-1].addChild(value)
+        elif event == ENTER:
+            self.stack.append(ParseTree(value, " "))
+        elif event == LEAVE:
+            node = self.stack.pop()
+            if self.stack:
+                self.stack[-1].addChild(node)
+            else:
+                self.tree = node
+        else:
+            # Abandoned productions are dropped, just like the parser drops them
+            self.stack.pop()
+
+
+    def getTree(self):
+        """
+        Get the tree built from the events seen so far
+        @return the ParseTree of the outermost production that has finished, or None
+        """
+        return self.tree
+
+
+
+class _StopStreaming(Exception):
+    """
+    Raised inside the parsing thread when the consumer of iterEvents() goes away
+    """
+    pass
+
+
+def iterEvents(parser, start="compileProgram", batch=256):
+    """
+    Run a parser on a background thread and yield its events as (event, value) pairs.
+    Events are handed over in batches through a bounded queue, so memory stays
+    proportional to the nesting depth rather than the size of the input.
+    @param parser The CompilerParser to run
+    @param start Name of the compile method to start from
+    @param batch Number of events handed over at a time
+    @return a generator of (event, value) pairs
+    """
+    batches = queue.Queue(4)
+    stop = threading.Event()
+    pending = []
+    outcome = []
+
+    def handler(event, value):
+        pending.append((event, value))
+        if len(pending) >= batch:
+            flush()
+
+    def flush():
+        if stop.is_set():
+            raise _StopStreaming()
+        batches.put(pending[:])
+        del pending[:]
+
+    def run():
+        try:
+            getattr(parser, start)()
+        except _StopStreaming:
+            return
+        except Exception as e:
+            outcome.append(e)
+        try:
+            flush()
+        except _StopStreaming:
+            return
+        batches.put(None)
+
+    previous = parser.handler
+    parser.handler = handler
+    worker = threading.Thread(target=run, daemon=True)
+    worker.start()
+    try:
+        while True:
+            events = batches.get()
+            if events is None:
+                break
+            yield from events
+        if outcome:
+            raise outcome[0]
+    finally:
+        stop.set()
+        while worker.is_alive():
+            try:
+                batches.get(timeout=0.05)
+            except queue.Empty:
+                pass
+        parser.handler = previous
@@ -1,3 +1,7 @@
+# Private name, so `from ParseTree import *` doesn't hand hashlib to every module
+import hashlib as _hashlib
+
+
 class ParseException(Exception):
     """
     Raised when tokens provided don't match the expected grammar
@@ -8,6 +12,8 @@ class ParseException(Exception):
 
 class ParseTree():
 
+    __slots__ = ("node_type", "value", "children", "structural_hash")
+
     def __init__(self, node_type, value):
         """
         A node in a Parse Tree data structure
@@ -17,6 +23,7 @@ class ParseTree():
         self.node_type = node_type
         self.value = value
         self.children = []
+        self.structural_hash = None
     
 
     def addChild(self,child):
@@ -25,6 +32,7 @@ class ParseTree():
         @param child The ParseTree to add
         """
         self.children.append(child)
+        self.structural_hash = None
     
 
     def getChildren(self):
@@ -51,6 +59,61 @@ class ParseTree():
         return self.value
     
 
+    def structuralHash(self):
+        """
+        Get a Merkle-style hash of this subtree, built from each node's type, value and its children's hashes.
+        Equal hashes mean structurally equal subtrees, and the hash is stable across processes.
+        Hashes are computed bottom-up on first use and cached on every node; addChild() clears a node's
+        cached hash, but not those of its ancestors, so finish building a tree before hashing it, or call
+        clearHashes() on the root after changing it.
+        @return the hash as 16 bytes
+        """
+        if self.structural_hash is not None:
+            return self.structural_hash
+        stack = [(self, False)]
+        while stack:
+            node, ready = stack.pop()
+            if node.structural_hash is not None:
+                continue
+            children = node.getChildren()
+            if ready or not children:
+                digest = _hashlib.blake2b(digest_size=16)
+                digest.update(b"T" if isinstance(node, Token) else b"N")
+                digest.update(node.getType().encode())
+                digest.update(b"\0")
+                digest.update(node.getValue().encode())
+                digest.update(b"\0")
+                for child in children:
+                    digest.update(child.structural_hash)
+                node.structural_hash = digest.digest()
+            else:
+                stack.append((node, True))
+                stack.extend((child, False) for child in children)
+        return self.structural_hash
+
+
+    def clearHashes(self):
+        """
+        Forget the cached structural hashes of every node in this subtree.
+        Nodes don't know their parents, so code that changes a tree in place after it may have been
+        hashed calls this on the root once it is done.
+        """
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            node.structural_hash = None
+            stack.extend(node.getChildren())
+
+
+    def sameStructure(self, other):
+        """
+        Check whether another tree has the same structure as this one without walking either
+        @param other The ParseTree to compare with
+        @return True if both subtrees have the same node types, values and shape
+        """
+        return self.structuralHash() == other.structuralHash()
+    
+
     def __str__(self,depth=0):
         """
         Generate a string from this ParseTree
@@ -83,5 +146,131 @@ class Token(ParseTree):
     """
     Token for parsing. Can be used as a terminal node in a ParseTree
     """
-    pass
+    __slots__ = ()
+
+    def __init__(self, node_type, value):
+        """
+        @param node_type The type of token (see element types).
+        @param value The token's text
+        """
+        self.node_type = node_type
+        self.value = value
+        # Tokens never have children, so all of them share one empty tuple instead of a list each
+        self.children = ()
+        self.structural_hash = None
     
+
+
+class BudgetExceeded(Exception):
+    """
+    Raised when a parse runs past one of the limits of its ParseBudget, or is cancelled.
+    Deliberately not a ParseException, so the parser's error recovery can't swallow it.
+    """
+
+    def __init__(self, reason, partial=None, tokens_consumed=0):
+        """
+        @param reason Which limit was exceeded
+        @param partial The tree built so far, with every unfinished production attached to its parent
+        @param tokens_consumed Number of tokens consumed before stopping
+        """
+        Exception.__init__(self, f"Parse budget exceeded: {reason} (after {tokens_consumed} tokens)")
+        self.reason = reason
+        self.partial = partial
+        self.tokens_consumed = tokens_consumed
+
+
+
+def countNodes(tree, sizes=None):
+    """
+    Count the nodes of a tree without recursion
+    @param tree The root of the tree
+    @param sizes Optional dict to also fill with the number of nodes in every subtree, keyed by node.
+        Subtrees already in it are not walked again.
+    @return the number of nodes in the tree
+    """
+    if sizes is None:
+        count = 0
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            count += 1
+            stack.extend(node.getChildren())
+        return count
+    # Children are held with their parent until it is counted, since nodes are dict keys
+    stack = [(tree, None)]
+    while stack:
+        node, children = stack.pop()
+        if node in sizes:
+            continue
+        if children is None:
+            children = node.getChildren()
+            if children:
+                stack.append((node, children))
+                stack.extend((child, None) for child in children)
+                continue
+        sizes[node] = 1 + sum(sizes[child] for child in children)
+    return sizes[tree]
+
+
+def flattenTree(tree):
+    """
+    Flatten a tree into preorder lists without recursion, the inverse of buildPreorder()
+    @param tree The root of the tree
+    @return (types, values, counts) with one entry per node, where values is None for interior nodes
+        and counts is the number of children, or -1 for tokens
+    """
+    if isinstance(tree, Token):
+        return [tree.node_type], [tree.value], [-1]
+    children = tree.getChildren()
+    types = [tree.node_type]
+    values = [None]
+    counts = [len(children)]
+    # Iterators over the children still to visit, innermost last
+    stack = [iter(children)]
+    while stack:
+        for node in stack[-1]:
+            types.append(node.node_type)
+            if isinstance(node, Token):
+                values.append(node.value)
+                counts.append(-1)
+            else:
+                children = node.getChildren()
+                values.append(None)
+                counts.append(len(children))
+                stack.append(iter(children))
+                break
+        else:
+            stack.pop()
+    return types, values, counts
+
+
+def buildPreorder(entries, attach=None):
+    """
+    Rebuild a tree from its nodes in preorder, each with the number of children that follow it
+    @param entries Iterable of (node, child count) pairs; a count of 0 or less means no children
+    @param attach Optional callable attach(parent, child) for nodes that aren't ParseTrees;
+        by default children are appended to parent.children
+    @return the root node
+    """
+    root = None
+    # Nodes still waiting for children, with how many they still need
+    open_nodes = []
+    for node, count in entries:
+        if open_nodes:
+            parent = open_nodes[-1]
+            if attach is None:
+                parent[0].children.append(node)
+            else:
+                attach(parent[0], node)
+            parent[1] -= 1
+            if parent[1] == 0:
+                open_nodes.pop()
+        elif root is None:
+            root = node
+        else:
+            raise ValueError("More than one root in preorder nodes")
+        if count > 0:
+            open_nodes.append([node, count])
+    if root is None or open_nodes:
+        raise ValueError("Incomplete preorder nodes")
+    return root
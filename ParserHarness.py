@@ -0,0 +1,310 @@
+import argparse
+import gc
+import importlib.util
+import multiprocessing
+import os
+import sys
+import time
+import tracemalloc
+
+from ParseTree import *
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Implementations that finish on every corpus; another.py always times out,
+# so it is only run when asked for with --parser
+DEFAULT_PARSERS = ("CompilerParser.py",)
+
+# Stands in for None children, which parsers that return None from unfinished methods add
+NONE_TYPE = "<None>"
+
+
+def loadParser(spec):
+    """
+    Load a parser implementation from a file without installing it as a module
+    @param spec Path of the .py file, optionally followed by :ClassName (CompilerParser by default)
+    @return the parser class
+    """
+    path, _, class_name = spec.partition(":")
+    path = os.path.abspath(path)
+    if ROOT not in sys.path:
+        # Implementations do `from ParseTree import *`
+        sys.path.insert(0, ROOT)
+    name = "parser_variant_" + os.path.splitext(os.path.basename(path))[0]
+    module_spec = importlib.util.spec_from_file_location(name, path)
+    if module_spec is None:
+        raise ValueError(f"Can't load a parser from {path}")
+    module = importlib.util.module_from_spec(module_spec)
+    module_spec.loader.exec_module(module)
+    return getattr(module, class_name or "CompilerParser")
+
+
+def treeShape(tree):
+    """
+    Flatten a tree into comparable plain data, without recursion
+    @param tree The ParseTree (or None)
+    @return a preorder list of (type, value, child count) as from flattenTree(), with value None
+        for interior nodes and a child count of -1 for tokens
+    """
+    if tree is None:
+        return [(NONE_TYPE, None, 0)]
+    return list(zip(*flattenTree(tree)))
+
+
+def nestShape(shape):
+    """
+    Rebuild the nesting of a flattened tree
+    @param shape A list from treeShape()
+    @return the root as a [type, value, children] list
+    """
+    return buildPreorder(
+        (([node_type, value, []], count) for node_type, value, count in shape),
+        lambda parent, child: parent[2].append(child),
+    )
+
+
+def describe(node):
+    """
+    @return a short description of a nested node for diff output
+    """
+    return node[0] if node[1] is None else f"{node[0]} {node[1]!r}"
+
+
+def diffShapes(expected, actual, limit=20):
+    """
+    Find where two flattened trees differ
+    @param expected A list from treeShape()
+    @param actual A list from treeShape()
+    @param limit Stop after this many differences
+    @return a list of lines, each a path of type[child index] steps from the root and the difference found there
+    """
+    differences = []
+    stack = [(nestShape(expected), nestShape(actual), "")]
+    while stack and len(differences) < limit:
+        left, right, path = stack.pop()
+        if left[0] != right[0] or left[1] != right[1]:
+            differences.append(f"{path or '/'}: {describe(left)} != {describe(right)}")
+            continue
+        path = path or left[0]
+        left_children = left[2]
+        right_children = right[2]
+        if len(left_children) != len(right_children):
+            differences.append(f"{path}: {len(left_children)} children != {len(right_children)}")
+            for index in range(min(len(left_children), len(right_children)), max(len(left_children), len(right_children))):
+                side, node = ("-", left_children[index]) if index < len(left_children) else ("+", right_children[index])
+                differences.append(f"{path}/{node[0]}[{index}]: {side} {describe(node)}")
+        pairs = list(zip(left_children, right_children))
+        for index in range(len(pairs) - 1, -1, -1):
+            stack.append((pairs[index][0], pairs[index][1], f"{path}/{pairs[index][0][0]}[{index}]"))
+    return differences[:limit]
+
+
+def measure(parser_class, tokens, start, repeat):
+    """
+    Parse the same tokens several times with one implementation
+    @param parser_class The parser class
+    @param tokens A list of tokens
+    @param start Name of the compile method to call
+    @param repeat Number of timed runs; the fastest is kept
+    @return a dict with the time, retained blocks, peak memory, exception counts and tree shape
+    """
+    result = {"tokens": len(tokens), "status": "ok", "error": None}
+
+    def parse():
+        parser = None
+        try:
+            parser = parser_class(tokens)
+            return getattr(parser, start)(), None, parser
+        except Exception as e:
+            return None, f"{type(e).__name__}: {e}", parser
+
+    best = None
+    for _ in range(repeat):
+        tree = None
+        gc.collect()
+        gc.disable()
+        try:
+            blocks = sys.getallocatedblocks()
+            begin = time.perf_counter()
+            tree, error, parser = parse()
+            elapsed = time.perf_counter() - begin
+            # Errors the parser recovered from, for implementations that keep them
+            diagnostics = getattr(parser, "diagnostics", None)
+            recovered = len(diagnostics) if diagnostics is not None else None
+            diagnostics = parser = None
+            # Blocks still allocated while only the tree is alive
+            retained = sys.getallocatedblocks() - blocks
+        finally:
+            gc.enable()
+        if best is None or elapsed < best:
+            best = elapsed
+    result["time"] = best
+    result["blocks"] = retained
+    result["shape"] = treeShape(tree) if error is None else None
+    if error is not None:
+        result["status"] = "error"
+        result["error"] = error
+    result["recovered"] = recovered
+
+    # One instrumented run: peak memory, and every exception raised including the ones recovered from
+    raised = {}
+    # An exception produces an event in every frame it passes through; count it once
+    last = [None]
+
+    def tracer(frame, event, arg):
+        if event == "exception" and arg[1] is not last[0]:
+            last[0] = arg[1]
+            name = type(arg[1]).__name__
+            raised[name] = raised.get(name, 0) + 1
+        return tracer
+
+    tracemalloc.start()
+    sys.settrace(tracer)
+    try:
+        parse()
+    finally:
+        sys.settrace(None)
+        last[0] = None
+        result["peak"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    result["raised"] = raised
+    return result
+
+
+def runVariant(spec, corpora, start, repeat, connection):
+    """
+    Measure one implementation on each corpus in turn, sending each result as soon as it is ready.
+    Runs in a child process so a hanging parser can be stopped.
+    @param spec Parser spec for loadParser()
+    @param corpora List of (name, tokens as (type, value) pairs)
+    @param start Name of the compile method to call
+    @param repeat Number of timed runs per corpus
+    @param connection Pipe end to send (name, result) pairs on
+    """
+    # Some implementations print the errors they recover from; this process only reports through
+    # the connection, so drop its output rather than let it mix into the comparison table
+    sys.stdout = open(os.devnull, "w")
+    parser_class = loadParser(spec)
+    for name, pairs in corpora:
+        tokens = [Token(token_type, value) for token_type, value in pairs]
+        connection.send((name, measure(parser_class, tokens, start, repeat)))
+    connection.close()
+
+
+def runHarness(specs, corpora, start="compileProgram", repeat=3, timeout=30.0):
+    """
+    Run every implementation on every corpus, each implementation in its own process.
+    A corpus that takes longer than the timeout is recorded as such, and the remaining corpora
+    are run in a fresh process.
+    @param specs Parser specs for loadParser()
+    @param corpora List of (name, tokens)
+    @param start Name of the compile method to call
+    @param repeat Number of timed runs per corpus
+    @param timeout Seconds allowed per corpus, for all runs together
+    @return a dict of results by spec, then by corpus name
+    """
+    corpora = [(name, [(token.getType(), token.getValue()) for token in tokens]) for name, tokens in corpora]
+    results = {}
+    for spec in specs:
+        results[spec] = {}
+        remaining = corpora
+        while remaining:
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(target=runVariant, args=(spec, remaining, start, repeat, sender), daemon=True)
+            process.start()
+            sender.close()
+            done = 0
+            for name, pairs in remaining:
+                status = None
+                try:
+                    if receiver.poll(timeout):
+                        received, result = receiver.recv()
+                        results[spec][received] = result
+                        done += 1
+                        continue
+                    status = "timeout"
+                except EOFError:
+                    status = "crashed"
+                results[spec][name] = {"tokens": len(pairs), "status": status, "error": f"{status} after {timeout:g}s" if status == "timeout" else "process exited", "shape": None}
+                done += 1
+                break
+            process.terminate()
+            process.join()
+            receiver.close()
+            remaining = remaining[done:]
+    return results
+
+
+def printComparison(specs, corpora, results, diff_limit=10):
+    """
+    Print the results side by side for each corpus, comparing trees with the first implementation
+    @param specs Parser specs, in the order given to runHarness()
+    @param corpora List of (name, tokens)
+    @param results The dict from runHarness()
+    @param diff_limit Differences to show per implementation and corpus
+    """
+    width = max(len(spec) for spec in specs)
+    for name, tokens in corpora:
+        print(f"\n{name}: {len(tokens)} tokens")
+        print(f"  {'parser':<{width}} {'ms':>9} {'ktok/s':>8} {'blocks':>8} {'peak KiB':>9} {'raised':>7} {'recov':>6}  tree")
+        reference = results[specs[0]][name].get("shape")
+        diffs = []
+        for spec in specs:
+            result = results[spec][name]
+            if result["status"] in ("timeout", "crashed"):
+                print(f"  {spec:<{width}} {result['error']}")
+                continue
+            raised = sum(result["raised"].values())
+            recovered = "-" if result["recovered"] is None else result["recovered"]
+            shape = result["shape"]
+            if spec == specs[0]:
+                verdict = "reference" if shape is not None else "-"
+            elif shape is None or reference is None:
+                verdict = "-"
+            elif shape == reference:
+                verdict = "same"
+            else:
+                verdict = "DIFFERS"
+                diffs.append((spec, diffShapes(reference, shape, diff_limit)))
+            throughput = result["tokens"] / result["time"] / 1000 if result["time"] else float("inf")
+            print(
+                f"  {spec:<{width}} {result['time'] * 1000:>9.2f} {throughput:>8.1f} {result['blocks']:>8} "
+                f"{result['peak'] / 1024:>9.1f} {raised:>7} {recovered:>6}  {verdict}"
+            )
+            if result["error"] is not None:
+                print(f"  {'':<{width}} {result['error']}")
+            if result["raised"]:
+                print(f"  {'':<{width}} raised: " + ", ".join(f"{kind} x{count}" for kind, count in sorted(result["raised"].items())))
+        for spec, lines in diffs:
+            print(f"  {spec} vs {specs[0]}:")
+            for line in lines:
+                print(f"    {line}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run parser implementations on the same inputs and compare them")
+    parser.add_argument("sources", nargs="*", help=".jack files to use as corpora")
+    parser.add_argument("--parser", action="append", dest="parsers", metavar="FILE[:CLASS]",
+                        help="parser implementation to load (repeatable; default: CompilerParser.py)")
+    parser.add_argument("--start", default="compileProgram", help="compile method to call")
+    parser.add_argument("--synthetic", type=int, action="append", default=[], metavar="SUBROUTINES",
+                        help="also use a generated class with this many subroutines (repeatable)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per corpus, fastest is kept")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds allowed per parser and corpus")
+    parser.add_argument("--diff", type=int, default=10, help="tree differences to show per parser and corpus")
+    args = parser.parse_args()
+
+    from JackTokenizer import JackTokenizer
+
+    specs = args.parsers or [os.path.join(ROOT, path) for path in DEFAULT_PARSERS]
+    corpora = [(path, JackTokenizer.fromFile(path).tokenize()) for path in args.sources]
+    if args.synthetic:
+        from benchmark import syntheticTokens
+        corpora.extend((f"synthetic {count}", syntheticTokens(count)) for count in args.synthetic)
+    if not corpora:
+        parser.error("give at least one .jack file or --synthetic")
+
+    specs = [os.path.relpath(spec) if os.path.isabs(spec) else spec for spec in specs]
+    results = runHarness(specs, corpora, args.start, args.repeat, args.timeout)
+    printComparison(specs, corpora, results, args.diff)
@@ -0,0 +1,78 @@
+import contextlib
+import queue
+import threading
+
+from CompilerParser import CompilerParser
+
+
+class ParserPool():
+
+    def __init__(self, size=8, parser_class=CompilerParser):
+        """
+        A bounded, thread-safe pool of reusable parsers.
+        Parsers are created on demand up to the pool size and recycled with reset().
+        @param size Maximum number of parsers in use at once
+        @param parser_class The parser class to instantiate
+        """
+        self.size = size
+        self.parser_class = parser_class
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+
+
+    def acquire(self, tokens, handler=None, timeout=None, budget=None):
+        """
+        Take a parser out of the pool, blocking while all of them are in use
+        @param tokens A list of tokens to be parsed
+        @param handler Optional event handler for the parser
+        @param budget Optional ParseBudget for the parse
+        @param timeout Seconds to wait for a free parser, or None to wait forever
+        @return a parser ready to parse the tokens
+        """
+        if not self.slots.acquire(timeout=timeout):
+            raise TimeoutError(f"No parser available within {timeout} seconds")
+        try:
+            parser = self.idle.get_nowait()
+        except queue.Empty:
+            return self.parser_class(tokens, handler, budget)
+        parser.reset(tokens, handler, budget)
+        return parser
+
+
+    def release(self, parser):
+        """
+        Return a parser to the pool. It must not be used again by the caller.
+        @param parser A parser obtained from acquire()
+        """
+        # Drop references to the last input so it can be freed while the parser sits idle
+        parser.reset([])
+        self.idle.put(parser)
+        self.slots.release()
+
+
+    @contextlib.contextmanager
+    def parser(self, tokens, handler=None, timeout=None, budget=None):
+        """
+        Borrow a parser for the duration of a with block
+        @param tokens A list of tokens to be parsed
+        @param handler Optional event handler for the parser
+        @param timeout Seconds to wait for a free parser, or None to wait forever
+        @param budget Optional ParseBudget for the parse
+        """
+        parser = self.acquire(tokens, handler, timeout, budget)
+        try:
+            yield parser
+        finally:
+            self.release(parser)
+
+
+    def parse(self, tokens, start="compileProgram", budget=None):
+        """
+        Parse a list of tokens with a pooled parser
+        @param tokens A list of tokens to be parsed
+        @param start Name of the compile method to start from
+        @param budget Optional ParseBudget for the parse
+        @return the ParseTree produced by the compile method
+        """
+        with self.parser(tokens, budget=budget) as parser:
+            return getattr(parser, start)()
@@ -0,0 +1,209 @@
+import argparse
+import concurrent.futures
+import json
+import os
+
+from ParseTree import *
+from CompilerParser import CompilerParser
+from JackTokenizer import JackTokenizer
+from JackWatcher import ProjectWatcher, fingerprintFile
+from ParallelParser import splitSubroutines
+from SemanticChecker import ClassContext
+
+
+INDEX_NAME = ".jackindex.json"
+
+# Bump when the stored layout changes; older index files are then rebuilt
+INDEX_VERSION = 1
+
+# Fewer changed files than this are indexed in this process rather than on a pool
+MIN_PARALLEL_FILES = 8
+
+
+def classSignature(tokens):
+    """
+    Read the declarations of a class without parsing subroutine bodies where possible
+    @param tokens The tokens of one class
+    @return a dict with the class name, fields, statics and subroutines, where each subroutine maps
+        to [kind, return type, [[type, name], ...]]
+    """
+    split = splitSubroutines(tokens)
+    if split is None or not split[0]:
+        context = ClassContext(CompilerParser(tokens).compileProgram())
+        subroutines = {name: [kind, return_type, [list(parameter) for parameter in parameters]]
+                       for name, (kind, return_type, parameters) in context.subroutines.items()}
+    else:
+        ranges, close = split
+        # Class header and field declarations, with the subroutines cut out
+        context = ClassContext(CompilerParser(tokens[:ranges[0][0]] + [tokens[close]]).compileProgram())
+        subroutines = {}
+        for start, end in ranges:
+            # constructor|function|method, type, name, (, parameters..., )
+            header = [token.getValue() for token in tokens[start:end]]
+            if len(header) < 5 or header[3] != "(" or ")" not in header[4:]:
+                raise ParseException(f"Malformed subroutine header in class {context.name}")
+            parameters = [value for value in header[4:header.index(")", 4)] if value != ","]
+            subroutines[header[2]] = [header[0], header[1], [list(pair) for pair in zip(parameters[::2], parameters[1::2])]]
+    return {"name": context.name, "fields": context.fields, "statics": context.statics, "subroutines": subroutines}
+
+
+def indexSource(data):
+    """
+    Index the contents of one .jack file. Runs in a worker process.
+    @param data File contents as bytes
+    @return a dict with the "class" signature, or None and the "error" that kept it out of the index
+    """
+    try:
+        return {"class": classSignature(JackTokenizer(data).tokenize()), "error": None}
+    except (ParseException, IndexError) as e:
+        return {"class": None, "error": str(e) or type(e).__name__}
+
+
+class ProjectIndex():
+
+    def __init__(self, root, path=None):
+        """
+        Signatures of every class in a project: fields, statics, and each subroutine's kind,
+        return type and parameters, so calls into other classes can be resolved without parsing them.
+        Persisted as JSON and updated one file at a time.
+        @param root Directory holding the project's .jack files
+        @param path Where the index is stored (INDEX_NAME under the root by default)
+        """
+        self.root = root
+        self.path = path or os.path.join(root, INDEX_NAME)
+        # Relative path -> dict with the file's mtime_ns, size and hex digest, and its entry from indexSource()
+        self.files = {}
+        # Class name -> signature dict from classSignature()
+        self.classes = {}
+
+
+    @staticmethod
+    def load(root, path=None):
+        """
+        Read a saved index, or start an empty one if there is none or it is from another version
+        @param root Directory holding the project's .jack files
+        @param path Where the index is stored (INDEX_NAME under the root by default)
+        @return a ProjectIndex; call update() to bring it up to date
+        """
+        index = ProjectIndex(root, path)
+        try:
+            with open(index.path, encoding="utf-8") as file:
+                saved = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return index
+        if saved.get("version") == INDEX_VERSION:
+            index.files = saved["files"]
+            index.rebuildClasses()
+        return index
+
+
+    def save(self):
+        """
+        Write the index, replacing the old file only once the new one is complete
+        """
+        temporary = self.path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump({"version": INDEX_VERSION, "files": self.files}, file, separators=(",", ":"), sort_keys=True)
+        os.replace(temporary, self.path)
+
+
+    def rebuildClasses(self):
+        """
+        Rebuild the class lookup table from the file entries. If two files declare the same class,
+        the one whose path sorts last wins.
+        """
+        self.classes = {
+            entry["class"]["name"]: entry["class"]
+            for path, entry in sorted(self.files.items())
+            if entry.get("class") is not None
+        }
+
+
+    def update(self, workers=None, executor=None):
+        """
+        Reindex files that were added or edited since the last update and forget removed ones.
+        Files are checked with fingerprintFile, so only files whose contents changed are reparsed.
+        @param workers Number of worker processes (defaults to the CPU count); 0 indexes in this process
+        @param executor Optional existing process pool to reuse across calls
+        @return (changed, removed) lists of paths relative to the root
+        """
+        changed = []
+        fingerprints = []
+        sources = []
+        seen = set()
+        for source in ProjectWatcher(self.root).sources():
+            path = os.path.relpath(source, self.root)
+            entry = self.files.get(path)
+            try:
+                if entry is None:
+                    stat, digest, data = fingerprintFile(source)
+                else:
+                    stat, digest, data = fingerprintFile(source, entry["mtime_ns"], entry["size"], bytes.fromhex(entry["digest"]))
+            except FileNotFoundError:
+                continue
+            seen.add(path)
+            if data is None:
+                entry["mtime_ns"] = stat.st_mtime_ns
+                entry["size"] = stat.st_size
+                continue
+            changed.append(path)
+            fingerprints.append({"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "digest": digest.hex()})
+            sources.append(data)
+
+        if workers == 0 or (executor is None and len(sources) < MIN_PARALLEL_FILES):
+            entries = list(map(indexSource, sources))
+        elif executor is not None:
+            entries = list(executor.map(indexSource, sources, chunksize=16))
+        else:
+            with concurrent.futures.ProcessPoolExecutor(workers or os.cpu_count() or 1) as pool:
+                entries = list(pool.map(indexSource, sources, chunksize=16))
+
+        for path, fingerprint, entry in zip(changed, fingerprints, entries):
+            fingerprint.update(entry)
+            self.files[path] = fingerprint
+        removed = [path for path in self.files if path not in seen]
+        for path in removed:
+            del self.files[path]
+        if changed or removed:
+            self.rebuildClasses()
+        return changed, removed
+
+
+    def lookupClass(self, name):
+        """
+        @param name A class name
+        @return the class's signature dict, or None if no file in the project declares it
+        """
+        return self.classes.get(name)
+
+
+    def lookupSubroutine(self, class_name, name):
+        """
+        @param class_name A class name
+        @param name A subroutine name
+        @return [kind, return type, [[type, name], ...]], or None if the class or subroutine is unknown
+        """
+        signature = self.classes.get(class_name)
+        return signature["subroutines"].get(name) if signature is not None else None
+
+
+    def errors(self):
+        """
+        @return a dict from relative path to the problem that kept each file out of the index
+        """
+        return {path: entry["error"] for path, entry in sorted(self.files.items()) if entry.get("error")}
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or update the class signature index of a Jack project")
+    parser.add_argument("root", nargs="?", default=".", help="project directory")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (0 to index in this process)")
+    args = parser.parse_args()
+
+    index = ProjectIndex.load(args.root)
+    changed, removed = index.update(args.workers)
+    index.save()
+    print(f"{len(changed)} indexed, {len(removed)} removed, {len(index.classes)} classes in {index.path}")
+    for path, error in index.errors().items():
+        print(f"  {path}: {error}")
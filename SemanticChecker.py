@@ -0,0 +1,322 @@
+import concurrent.futures
+import os
+
+from ParseTree import *
+
+
+# Jack stores all of these as one word and converts between them freely
+PRIMITIVE_TYPES = frozenset(("int", "char", "boolean"))
+
+# Fewer subroutines than this are checked in this process rather than on a new pool, since starting
+# a pool costs about as much as checking a few hundred subroutines
+MIN_PARALLEL_SUBROUTINES = 512
+
+
+class Diagnostic():
+
+    def __init__(self, class_name, subroutine, message):
+        """
+        A problem found by semantic checking
+        @param class_name Name of the class the problem is in
+        @param subroutine Name of the subroutine the problem is in
+        @param message Description of the problem
+        """
+        self.class_name = class_name
+        self.subroutine = subroutine
+        self.message = message
+
+
+    def __str__(self):
+        return f"{self.class_name}.{self.subroutine}: {self.message}"
+
+
+
+class ClassContext():
+
+    def __init__(self, class_tree):
+        """
+        Class-level declarations that every subroutine of a class can see
+        @param class_tree The ParseTree of a class
+        """
+        children = class_tree.getChildren()
+        self.name = children[1].getValue()
+        self.fields = {}
+        self.statics = {}
+        # name -> (constructor|function|method, return type, list of (type, name) parameters)
+        self.subroutines = {}
+        # Subroutines of other classes, by class name, when a ProjectIndex is available
+        self.external = {}
+        for child in children:
+            if child.getType() == "classVarDec":
+                kind, var_type, names = declaration(child.getChildren())
+                table = self.statics if kind == "static" else self.fields
+                for name in names:
+                    table[name] = var_type
+            elif child.getType() == "subroutine":
+                parts = child.getChildren()
+                self.subroutines[parts[2].getValue()] = (parts[0].getValue(), parts[1].getValue(), parameters(parts[4]))
+
+
+
+def declaration(tokens):
+    """
+    Read a classVarDec or varDec
+    @param tokens The declaration's children: static|field|var, type, name (, name)* ;
+    @return (kind, type, list of names)
+    """
+    names = [token.getValue() for token in tokens[2:] if token.getType() == "identifier"]
+    return tokens[0].getValue(), tokens[1].getValue(), names
+
+
+def parameters(parameter_list):
+    """
+    Read a parameterList
+    @param parameter_list The parameterList ParseTree
+    @return a list of (type, name) pairs
+    """
+    tokens = [token for token in parameter_list.getChildren() if token.getValue() != ","]
+    return [(tokens[i].getValue(), tokens[i + 1].getValue()) for i in range(0, len(tokens) - 1, 2)]
+
+
+def isEmptyExpression(expression):
+    """
+    The parser represents the missing argument of f() as an expression holding an empty term
+    @return True if the expression has no tokens at all
+    """
+    children = expression.getChildren()
+    return len(children) == 1 and not isinstance(children[0], Token) and not children[0].getChildren()
+
+
+def argumentCount(expression_list):
+    """
+    @param expression_list An expressionList ParseTree
+    @return the number of arguments it holds
+    """
+    return sum(
+        1 for child in expression_list.getChildren()
+        if child.getType() == "expression" and not isEmptyExpression(child)
+    )
+
+
+def constantType(context, expression):
+    """
+    Find the type of an expression that is a single constant, this or null
+    @param context The ClassContext of the enclosing class
+    @param expression An expression ParseTree
+    @return the type name, "null", or None if the type can't be told without inference
+    """
+    children = expression.getChildren()
+    if len(children) != 1 or isinstance(children[0], Token):
+        return None
+    term = children[0].getChildren()
+    if len(term) != 1 or not isinstance(term[0], Token):
+        return None
+    token_type = term[0].getType()
+    value = term[0].getValue()
+    if token_type == "integerConstant":
+        return "int"
+    if token_type == "stringConstant":
+        return "String"
+    if value in ("true", "false"):
+        return "boolean"
+    if value == "this":
+        return context.name
+    if value == "null":
+        return "null"
+    return None
+
+
+def acceptsType(declared, value_type):
+    """
+    @param declared The declared return type
+    @param value_type A type found by constantType()
+    @return True if a value of value_type may be returned as declared
+    """
+    if declared in PRIMITIVE_TYPES:
+        return value_type in PRIMITIVE_TYPES
+    return value_type == declared or value_type == "null"
+
+
+def checkSubroutine(context, subroutine):
+    """
+    Check one subroutine for undeclared variables, call arity and return types. Returns are checked
+    for a value against void, and returned constants, this and null against the declared type;
+    other returned expressions are not type checked.
+    @param context The ClassContext of the enclosing class
+    @param subroutine The subroutine ParseTree
+    @return a list of Diagnostics in source order
+    """
+    parts = subroutine.getChildren()
+    kind = parts[0].getValue()
+    return_type = parts[1].getValue()
+    name = parts[2].getValue()
+    diagnostics = []
+
+    def report(message):
+        diagnostics.append(Diagnostic(context.name, name, message))
+
+    # Variables in scope: locals and parameters shadow fields and statics
+    variables = dict(context.statics)
+    if kind != "function":
+        variables.update(context.fields)
+    for var_type, var_name in parameters(parts[4]):
+        variables[var_name] = var_type
+    returns = 0
+
+    stack = [child for child in reversed(parts[6:]) if not isinstance(child, Token)]
+    while stack:
+        node = stack.pop()
+        node_type = node.getType()
+        children = node.getChildren()
+        if node_type == "varDec":
+            var_kind, var_type, names = declaration(children)
+            for var_name in names:
+                variables[var_name] = var_type
+        elif node_type == "letStatement":
+            target = children[1].getValue()
+            if target not in variables:
+                report(f"assignment to undeclared variable '{target}'")
+        elif node_type == "returnStatement":
+            returns += 1
+            has_value = len(children) > 2 and not isEmptyExpression(children[1])
+            if return_type == "void" and has_value:
+                report("void subroutine returns a value")
+            elif return_type != "void" and not has_value:
+                report(f"missing return value of type {return_type}")
+            elif has_value:
+                value_type = constantType(context, children[1])
+                if value_type is not None and not acceptsType(return_type, value_type):
+                    report(f"returns {value_type} from subroutine of type {return_type}")
+        elif node_type == "term" and children and children[0].getType() == "identifier":
+            checkTerm(context, variables, children, report)
+        stack.extend(child for child in reversed(children) if not isinstance(child, Token))
+
+    if returns == 0:
+        report("no return statement")
+    return diagnostics
+
+
+def checkTerm(context, variables, children, report):
+    """
+    Check a term that starts with an identifier: a variable, an array element or a call
+    @param context The ClassContext of the enclosing class
+    @param variables Dict of variables in scope
+    @param children The term's children
+    @param report Callable taking a diagnostic message
+    """
+    first = children[0].getValue()
+    follower = children[1].getValue() if len(children) > 1 else None
+    if follower == "(":
+        called, target_class = first, context.name
+        arguments = children[2]
+    elif follower == ".":
+        called = children[2].getValue()
+        # obj.f() calls a method of obj's class; otherwise the name before the dot is a class
+        target_class = variables.get(first, first)
+        arguments = children[4]
+    else:
+        if first not in variables:
+            report(f"use of undeclared variable '{first}'")
+        return
+    if target_class == context.name:
+        subroutines = context.subroutines
+    else:
+        subroutines = context.external.get(target_class)
+        if subroutines is None:
+            # Classes outside the project, such as the OS, are not known here
+            return
+    signature = subroutines.get(called)
+    if signature is None:
+        report(f"call to undeclared subroutine '{target_class}.{called}'")
+        return
+    expected = len(signature[2])
+    given = argumentCount(arguments)
+    if given != expected:
+        report(f"'{target_class}.{called}' takes {expected} argument(s) but {given} given")
+
+
+def unpackTree(packed):
+    """
+    Rebuild a tree flattened by flattenTree(), which pickles far faster than the node objects
+    @param packed The (types, values, counts) lists
+    @return the ParseTree
+    """
+    return buildPreorder(
+        (Token(node_type, value) if count < 0 else ParseTree(node_type, " "), count)
+        for node_type, value, count in zip(*packed)
+    )
+
+
+def checkBatch(context, subroutines):
+    """
+    Check a batch of subroutines from one class. Runs in a worker process.
+    @param context The ClassContext of the class
+    @param subroutines List of subroutines, each flattened by flattenTree()
+    @return a list of Diagnostic lists, one per subroutine
+    """
+    return [checkSubroutine(context, unpackTree(subroutine)) for subroutine in subroutines]
+
+
+def referencedClasses(tree, index):
+    """
+    Find the indexed classes a class could refer to: any identifier that names one
+    @param tree The ParseTree of a class
+    @param index A ProjectIndex
+    @return a dict from class name to that class's indexed subroutines
+    """
+    external = {}
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Token):
+            if node.getType() == "identifier":
+                signature = index.lookupClass(node.getValue())
+                if signature is not None:
+                    external[node.getValue()] = signature["subroutines"]
+        else:
+            stack.extend(node.getChildren())
+    return external
+
+
+def checkProgram(trees, workers=None, executor=None, batch=32, index=None):
+    """
+    Run semantic checks over the subroutines of one or more classes as independent tasks
+    on a process pool. Diagnostics come back in class order, then subroutine order, then source order,
+    however the tasks were scheduled.
+    @param trees A class ParseTree or a list of them, as produced by compileProgram()
+    @param workers Number of worker processes (defaults to the CPU count); 0 checks in this process,
+        as does any call without an executor that has fewer than MIN_PARALLEL_SUBROUTINES subroutines
+    @param executor Optional existing pool to reuse across calls
+    @param batch Number of subroutines sent to a worker at a time
+    @param index Optional ProjectIndex, to also check calls into other classes of the project
+    @return a list of Diagnostics
+    """
+    if isinstance(trees, ParseTree):
+        trees = [trees]
+    tasks = []
+    total = 0
+    for tree in trees:
+        context = ClassContext(tree)
+        if index is not None:
+            context.external = referencedClasses(tree, index)
+            context.external.pop(context.name, None)
+        subroutines = [child for child in tree.getChildren() if child.getType() == "subroutine"]
+        total += len(subroutines)
+        for start in range(0, len(subroutines), batch):
+            tasks.append((context, subroutines[start:start + batch]))
+
+    if workers == 0 or (executor is None and total < MIN_PARALLEL_SUBROUTINES):
+        diagnostics = []
+        for context, subroutines in tasks:
+            for subroutine in subroutines:
+                diagnostics.extend(checkSubroutine(context, subroutine))
+        return diagnostics
+
+    tasks = [(context, [flattenTree(subroutine) for subroutine in subroutines]) for context, subroutines in tasks]
+    if executor is not None:
+        results = list(executor.map(checkBatch, *zip(*tasks))) if tasks else []
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers or os.cpu_count() or 1) as pool:
+            results = list(pool.map(checkBatch, *zip(*tasks))) if tasks else []
+
+    return [diagnostic for batch_results in results for diagnostics in batch_results for diagnostic in diagnostics]
@@ -0,0 +1,273 @@
+import sys
+import weakref
+
+from ParseTree import *
+from CompilerParser import CompilerParser
+
+
+class SharedShape(ParseTree):
+
+    """
+    An interned, immutable subtree. Structurally identical subtrees share one SharedShape.
+    Shapes are never handed out directly; SharedTree handles give access to them.
+    """
+    __slots__ = ("__weakref__",)
+
+
+
+class SharedTree(ParseTree):
+
+    """
+    A position in a hash-consed tree. Handles are cheap views onto a SharedShape, created by
+    getChildren() for one level at a time. A node's list of child handles is only held weakly by the
+    node, and strongly by each handle in it, so a walk that lets go of the nodes it has visited leaves
+    nothing behind, while any handle still in use keeps getChildren() returning it at its position.
+    Changes are copy-on-write: changing a node's children (addChild(), assigning children or changing
+    the list getChildren() returned) gives the node and each of its ancestors a private list of
+    children, leaving every other user of the shape unchanged.
+    """
+    __slots__ = ("shape", "owner", "position", "siblings", "handles", "own_children")
+
+    def __init__(self, shape, owner=None, position=0, siblings=None):
+        """
+        @param shape The SharedShape this handle views
+        @param owner The SharedTree handle of the parent, or None for the root
+        @param position Index of this node among its parent's children
+        @param siblings The HandleList this handle is in, or None for the root
+        """
+        self.node_type = shape.node_type
+        self.value = shape.value
+        self.structural_hash = shape.structural_hash
+        self.shape = shape
+        self.owner = owner
+        self.position = position
+        self.siblings = siblings
+        # Weak reference to the current HandleList of children, while one is in use
+        self.handles = None
+        # Strongly held list of children once this node has been changed
+        self.own_children = None
+
+
+    def getChildren(self):
+        """
+        Get a list of child nodes in the order they were added.
+        @return A list of SharedTree and SharedToken handles, the same list for as long as it or any
+            handle in it is still referenced
+        """
+        if self.own_children is not None:
+            return self.own_children
+        handles = self.handles() if self.handles is not None else None
+        if handles is None:
+            handles = HandleList([
+                SharedToken(child) if isinstance(child, Token) else SharedTree(child, self, position)
+                for position, child in enumerate(self.shape.children)
+            ], self)
+            for handle in handles:
+                handle.siblings = handles
+            self.handles = weakref.ref(handles)
+        return handles
+
+
+    @property
+    def children(self):
+        return self.getChildren()
+
+
+    @children.setter
+    def children(self, children):
+        self.detach()
+        self.own_children = children
+        self.clearAncestorHashes()
+
+
+    def addChild(self, child):
+        """
+        Adds a ParseTree as a child of this node, copying shared structure first
+        @param child The ParseTree to add
+        """
+        self.detach().append(child)
+        self.clearAncestorHashes()
+
+
+    def clearAncestorHashes(self):
+        """
+        Forget the cached structural hashes of this node and every ancestor, after a change below them
+        """
+        node = self
+        while node is not None:
+            node.structural_hash = None
+            node = node.owner
+
+
+    def detach(self):
+        """
+        Stop this handle, and every ancestor, from viewing its shared shape so it can be changed.
+        Each of them keeps its current list of children from then on.
+        @return this node's list of children
+        """
+        if self.own_children is None:
+            self.own_children = self.getChildren()
+            self.shape = None
+            self.handles = None
+            if self.owner is not None:
+                siblings = self.owner.detach()
+                if siblings[self.position] is not self:
+                    list.__setitem__(siblings, self.position, self)
+                    self.siblings = siblings
+        return self.own_children
+
+
+
+class SharedToken(Token):
+
+    """
+    A token at one position of a hash-consed tree. Tokens are interned like subtrees, so each
+    position gets its own copy, and equal tokens in different places stay distinct objects.
+    """
+    __slots__ = ("siblings",)
+
+    def __init__(self, token, siblings=None):
+        """
+        @param token The canonical Token
+        @param siblings The HandleList this token is in
+        """
+        Token.__init__(self, token.node_type, token.value)
+        self.structural_hash = token.structural_hash
+        self.siblings = siblings
+
+
+
+class HandleList(list):
+
+    """
+    The children of a SharedTree handle. Changing the list detaches the handle first, so the change
+    is kept and seen by everything that walks the tree.
+    """
+    __slots__ = ("owner", "__weakref__")
+
+    def __init__(self, handles, owner):
+        """
+        @param handles The child handles
+        @param owner The SharedTree whose children these are
+        """
+        list.__init__(self, handles)
+        self.owner = owner
+
+
+    def changing(self):
+        """
+        Make the owner keep this list before it changes
+        """
+        if self.owner.own_children is None:
+            self.owner.detach()
+        self.owner.clearAncestorHashes()
+
+
+
+def changesHandles(name):
+    """
+    Wrap a list method that changes the list so it goes through HandleList.changing() first
+    """
+    method = getattr(list, name)
+
+    def change(self, *args):
+        self.changing()
+        return method(self, *args)
+
+    change.__name__ = name
+    return change
+
+
+for _name in ("append", "extend", "insert", "pop", "remove", "clear", "sort", "reverse",
+              "__setitem__", "__delitem__", "__iadd__"):
+    setattr(HandleList, _name, changesHandles(_name))
+del _name
+
+
+
+class SubtreeInterner():
+
+    def __init__(self):
+        """
+        Table of interned subtrees. Shapes are held weakly, so they disappear along with the last
+        tree using them; tokens are kept for the lifetime of the interner.
+        """
+        self.shapes = weakref.WeakValueDictionary()
+        self.tokens = {}
+        self.nodes_seen = 0
+        self.nodes_shared = 0
+        self.bytes_saved = 0
+
+
+    def intern(self, tree):
+        """
+        Build a hash-consed copy of a tree
+        @param tree The ParseTree to intern
+        @return a SharedTree handle for the root, or the canonical Token if tree is a Token
+        """
+        tree.structuralHash()
+        interned = {}
+        stack = [(tree, None)]
+        while stack:
+            node, children = stack.pop()
+            if node in interned:
+                continue
+            if children is None:
+                children = node.getChildren()
+                if children:
+                    # Hold the children with their parent: a handle's children may be rebuilt on demand
+                    stack.append((node, children))
+                    stack.extend((child, None) for child in children)
+                    continue
+            self.nodes_seen += 1
+            if isinstance(node, Token):
+                key = (node.getType(), node.getValue())
+                canonical = self.tokens.get(key)
+                if canonical is None:
+                    canonical = self.tokens[key] = node
+                elif canonical is not node:
+                    self.nodes_shared += 1
+                    self.bytes_saved += sys.getsizeof(node)
+            else:
+                canonical = self.shapes.get(node.structural_hash)
+                if canonical is None:
+                    canonical = SharedShape(node.getType(), node.getValue())
+                    canonical.children = [interned[child] for child in children]
+                    canonical.structural_hash = node.structural_hash
+                    self.shapes[node.structural_hash] = canonical
+                else:
+                    self.nodes_shared += 1
+                    self.bytes_saved += sys.getsizeof(node) + sys.getsizeof(node.children)
+            interned[node] = canonical
+        root = interned[tree]
+        if isinstance(root, Token):
+            return root
+        return SharedTree(root)
+
+
+    def stats(self):
+        """
+        Report how much interning has saved so far
+        @return a dict with nodes_seen, nodes_shared, dedupe_ratio (nodes seen per node kept) and
+            bytes_saved (estimated from the sizes of the node objects that were replaced)
+        """
+        kept = self.nodes_seen - self.nodes_shared
+        return {
+            "nodes_seen": self.nodes_seen,
+            "nodes_shared": self.nodes_shared,
+            "dedupe_ratio": self.nodes_seen / kept if kept else 1.0,
+            "bytes_saved": self.bytes_saved,
+        }
+
+
+
+def parseShared(tokens, interner=None):
+    """
+    Parse a program into a hash-consed tree
+    @param tokens A list of tokens to be parsed
+    @param interner SubtreeInterner to share subtrees with, e.g. across files; a new one by default
+    @return a SharedTree handle for the program
+    """
+    if interner is None:
+        interner = SubtreeInterner()
+    return interner.intern(CompilerParser(tokens).compileProgram())
@@ -0,0 +1,75 @@
+import mmap
+import sys
+
+from ParseTree import *
+
+
+class SourceBuffer():
+
+    def __init__(self, data):
+        """
+        Shared, read-only source text that tokens are cut from. Each distinct spelling is decoded once
+        and shared by every token with that value, so a token costs no more than its Token object.
+        @param data The source as bytes or an mmap, UTF-8 encoded
+        """
+        self.data = data
+        self.interned = {}
+
+
+    @staticmethod
+    def fromFile(path):
+        """
+        Map a source file into memory without reading it
+        @param path Path of the file
+        @return a SourceBuffer over the file's contents
+        """
+        with open(path, "rb") as file:
+            try:
+                return SourceBuffer(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+            except ValueError:
+                # Empty files can't be mapped
+                return SourceBuffer(b"")
+
+
+    def token(self, token_type, offset, length):
+        """
+        Create a token for a slice of this buffer
+        @param token_type The type of token (see element types).
+        @param offset Byte offset of the token's value
+        @param length Byte length of the token's value
+        @return a Token whose value is shared with every other token of the same spelling
+        """
+        return Token(token_type, self.internedText(offset, length))
+
+
+    def text(self, offset, length):
+        """
+        Decode a slice of this buffer
+        @param offset Byte offset of the slice
+        @param length Byte length of the slice
+        @return the slice as a str
+        """
+        return str(self.data[offset:offset + length], "utf-8")
+
+
+    def internedText(self, offset, length):
+        """
+        Decode a slice of this buffer, sharing one str per distinct spelling
+        @param offset Byte offset of the slice
+        @param length Byte length of the slice
+        @return the slice as an interned str
+        """
+        raw = self.data[offset:offset + length]
+        text = self.interned.get(raw)
+        if text is None:
+            text = sys.intern(str(raw, "utf-8"))
+            self.interned[raw] = text
+        return text
+
+
+    def close(self):
+        """
+        Release the underlying mapping. Tokens already created keep their values.
+        """
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
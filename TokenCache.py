@@ -0,0 +1,143 @@
+import array
+import gc
+import marshal
+import os
+
+from ParseTree import *
+
+
+CACHE_SUFFIX = ".jackt"
+
+CACHE_MAGIC = "jackt"
+
+# Bump when the tokenizer or the cache layout changes; older caches are then ignored
+CACHE_VERSION = 1
+
+# Token types by their one-byte code in a cache file
+TOKEN_TYPES = ("keyword", "symbol", "identifier", "integerConstant", "stringConstant")
+
+TYPE_CODES = {token_type: code for code, token_type in enumerate(TOKEN_TYPES)}
+
+
+def cachePath(path):
+    """
+    @param path Path of a .jack file
+    @return the path of its token cache, next to it
+    """
+    return os.path.splitext(path)[0] + CACHE_SUFFIX
+
+
+def writeCache(path, tokens, stat, digest):
+    """
+    Save the tokens of a source file next to it. Failing to write (e.g. a read-only directory) is not an error.
+    The cache holds each distinct (type, value) pair once, and the tokens as an array of indices into them.
+    @param path Path of the .jack file
+    @param tokens Its tokens
+    @param stat os.stat() of the file when it was read
+    @param digest Content hash of the file
+    @return True if the cache was written
+    """
+    pairs = {}
+    indices = []
+    for token in tokens:
+        pair = (token.getType(), token.getValue())
+        index = pairs.get(pair)
+        if index is None:
+            index = pairs[pair] = len(pairs)
+        indices.append(index)
+    types = bytes([TYPE_CODES[token_type] for token_type, value in pairs])
+    values = [value for token_type, value in pairs]
+    typecode = "H" if len(pairs) <= 0xFFFF else "I"
+    data = marshal.dumps((
+        CACHE_MAGIC, CACHE_VERSION, stat.st_size, stat.st_mtime_ns, digest,
+        types, values, typecode, array.array(typecode, indices).tobytes(),
+    ))
+    target = cachePath(path)
+    temporary = target + ".tmp"
+    try:
+        with open(temporary, "wb") as file:
+            file.write(data)
+        os.replace(temporary, target)
+    except OSError:
+        return False
+    return True
+
+
+def readCache(path):
+    """
+    Read the token cache of a source file without checking it against the source
+    @param path Path of the .jack file
+    @return (size, mtime_ns, digest, types, values, typecode, indices) as stored, or None if there is no usable cache
+    """
+    try:
+        with open(cachePath(path), "rb") as file:
+            cached = marshal.loads(file.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(cached, tuple) or len(cached) != 9 or cached[:2] != (CACHE_MAGIC, CACHE_VERSION):
+        return None
+    types, values, typecode, indices = cached[5:]
+    if not isinstance(types, bytes) or not isinstance(values, list) or len(types) != len(values):
+        return None
+    if typecode not in ("H", "I") or not isinstance(indices, bytes) or len(indices) % array.array(typecode).itemsize:
+        return None
+    if types and max(types) >= len(TOKEN_TYPES):
+        return None
+    return cached[2:]
+
+
+def loadTokens(path, use_cache=True, write_cache=True):
+    """
+    Get the tokens of a .jack file, from its .jackt cache when that is still valid.
+    A cache is trusted without reading the source if the source's size and mtime match; otherwise
+    the source is read and the cache is still used if its content hash matches.
+    @param path Path of the .jack file
+    @param use_cache Read the cache if there is one
+    @param write_cache Write a new cache after tokenizing
+    @return (tokens, from_cache)
+    """
+    stat = os.stat(path)
+    cached = readCache(path) if use_cache else None
+    if cached is not None and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+        tokens = buildTokens(*cached[3:])
+        if tokens is not None:
+            return tokens, True
+
+    # Only pay for hashing and tokenizing when the cache can't be trusted as it is
+    from JackTokenizer import JackTokenizer
+    from JackWatcher import contentHash
+
+    with open(path, "rb") as file:
+        data = file.read()
+    digest = contentHash(data)
+    if cached is not None and cached[2] == digest:
+        tokens = buildTokens(*cached[3:])
+        if tokens is not None:
+            if write_cache:
+                # Same contents with a new mtime: refresh the stored stat so the next load skips reading
+                writeCache(path, tokens, stat, digest)
+            return tokens, True
+
+    tokens = JackTokenizer(data).tokenize()
+    if write_cache:
+        writeCache(path, tokens, stat, digest)
+    return tokens, False
+
+
+def buildTokens(types, values, typecode, indices):
+    """
+    Rebuild the tokens stored in a cache
+    @return a list of Tokens, or None if the indices don't fit the stored pairs
+    """
+    indices = memoryview(indices).cast(typecode)
+    if len(indices) and max(indices) >= len(values):
+        return None
+    pairs = [(TOKEN_TYPES[code], value) for code, value in zip(types, values)]
+    # Building tokens is pure allocation of acyclic objects, so don't let the cycle collector rescan them
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        return [Token(*pairs[index]) for index in indices]
+    finally:
+        if collecting:
+            gc.enable()
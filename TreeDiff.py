@@ -0,0 +1,254 @@
+import bisect
+from collections import deque
+
+from ParseTree import *
+
+
+INSERT = "insert"
+DELETE = "delete"
+UPDATE = "update"
+MOVE = "move"
+
+# Subtrees whose sizes differ by more than this factor are not paired by key
+SIZE_RATIO = 2.0
+
+# How many of the earliest unmatched candidates of the same kind a node is compared with
+ALIGN_WINDOW = 8
+
+
+class Edit():
+
+    def __init__(self, kind, old_path, new_path, old_node, new_node):
+        """
+        One step of an edit script that turns an old tree into a new one
+        @param kind INSERT, DELETE, UPDATE or MOVE
+        @param old_path Tuple of child indices locating the node in the old tree, or None for an insert
+        @param new_path Tuple of child indices locating the node in the new tree, or None for a delete
+        @param old_node The node in the old tree, or None for an insert
+        @param new_node The node in the new tree, or None for a delete
+        """
+        self.kind = kind
+        self.old_path = old_path
+        self.new_path = new_path
+        self.old_node = old_node
+        self.new_node = new_node
+
+
+    def __str__(self):
+        def where(path):
+            return "/" + "/".join(str(index) for index in path)
+
+        if self.kind == INSERT:
+            return f"insert {where(self.new_path)} {self.new_node.getType()}{describeValue(self.new_node)}"
+        if self.kind == DELETE:
+            return f"delete {where(self.old_path)} {self.old_node.getType()}{describeValue(self.old_node)}"
+        if self.kind == UPDATE:
+            return f"update {where(self.old_path)} {self.old_node.getValue()!r} -> {self.new_node.getValue()!r}"
+        return f"move {where(self.old_path)} -> {where(self.new_path)} {self.old_node.getType()}"
+
+
+
+def describeValue(node):
+    """
+    @return the value of a token for display, or an empty string for interior nodes
+    """
+    return f" {node.getValue()!r}" if isinstance(node, Token) else ""
+
+
+def stableIndices(sequence):
+    """
+    Find a longest increasing subsequence, in O(n log n)
+    @param sequence A list of distinct integers
+    @return the set of positions in the sequence that belong to it
+    """
+    tails = []
+    tail_positions = []
+    previous = [None] * len(sequence)
+    for position, value in enumerate(sequence):
+        slot = bisect.bisect_left(tails, value)
+        if slot == len(tails):
+            tails.append(value)
+            tail_positions.append(position)
+        else:
+            tails[slot] = value
+            tail_positions[slot] = position
+        previous[position] = tail_positions[slot - 1] if slot else None
+    stable = set()
+    position = tail_positions[-1] if tail_positions else None
+    while position is not None:
+        stable.add(position)
+        position = previous[position]
+    return stable
+
+
+class TreeDiffer():
+
+    def __init__(self, old_tree, new_tree):
+        """
+        Computes an edit script between two parses of the same file
+        @param old_tree The tree before the change
+        @param new_tree The tree after the change
+        """
+        self.old_tree = old_tree
+        self.new_tree = new_tree
+        self.sizes = {}
+
+
+    def size(self, node):
+        """
+        @return the number of nodes in a subtree, counted once along with every subtree below it
+        """
+        size = self.sizes.get(node)
+        if size is None:
+            size = countNodes(node, self.sizes)
+        return size
+
+
+    def alignChildren(self, old_children, new_children):
+        """
+        Pair up the children of two matched nodes: first identical subtrees by structural hash,
+        then nodes with the same type and value in order (interior nodes of similar size among the next
+        ALIGN_WINDOW candidates), then tokens of the same type
+        @return a list of (old index, new index) pairs in new order
+        """
+        pairs = {}
+        unmatched_old = set(range(len(old_children)))
+
+        by_hash = {}
+        for index, child in enumerate(old_children):
+            by_hash.setdefault(child.structural_hash, deque()).append(index)
+        for index, child in enumerate(new_children):
+            candidates = by_hash.get(child.structural_hash)
+            if candidates:
+                old_index = candidates.popleft()
+                pairs[index] = old_index
+                unmatched_old.discard(old_index)
+        if len(pairs) == len(new_children) or not unmatched_old:
+            return [(index, pairs[index]) for index in range(len(new_children)) if index in pairs]
+
+        # Interior nodes all have the same value, so many siblings share a key; pairing in order and
+        # only looking a few candidates ahead keeps this linear
+        by_key = {}
+        for index in sorted(unmatched_old):
+            child = old_children[index]
+            by_key.setdefault((child.getType(), child.getValue(), isinstance(child, Token)), deque()).append(index)
+        for index, child in enumerate(new_children):
+            if index in pairs:
+                continue
+            is_token = isinstance(child, Token)
+            candidates = by_key.get((child.getType(), child.getValue(), is_token))
+            if not candidates:
+                continue
+            slot = 0
+            if not is_token:
+                # Closest in size, then nearest in position
+                size = self.size(child)
+                slot = min(
+                    range(min(ALIGN_WINDOW, len(candidates))),
+                    key=lambda slot: (abs(self.size(old_children[candidates[slot]]) - size), abs(candidates[slot] - index)),
+                )
+                old_size = self.size(old_children[candidates[slot]])
+                if max(old_size, size) > SIZE_RATIO * min(old_size, size):
+                    continue
+            best = candidates[slot]
+            del candidates[slot]
+            pairs[index] = best
+            unmatched_old.discard(best)
+
+        # Remaining tokens of the same type in order are the same token with a new value
+        by_type = {}
+        for index in sorted(unmatched_old):
+            child = old_children[index]
+            if isinstance(child, Token):
+                by_type.setdefault(child.getType(), deque()).append(index)
+        for index, child in enumerate(new_children):
+            if index not in pairs and isinstance(child, Token):
+                candidates = by_type.get(child.getType())
+                if candidates:
+                    pairs[index] = candidates.popleft()
+        return [(index, pairs[index]) for index in range(len(new_children)) if index in pairs]
+
+
+    def diff(self):
+        """
+        Walk both trees top-down, skipping identical subtrees by structural hash
+        @return a list of Edits
+        """
+        old_tree = self.old_tree
+        new_tree = self.new_tree
+        old_tree.structuralHash()
+        new_tree.structuralHash()
+        edits = []
+        if old_tree.getType() != new_tree.getType() or isinstance(old_tree, Token) != isinstance(new_tree, Token):
+            return [Edit(DELETE, (), None, old_tree, None), Edit(INSERT, None, (), None, new_tree)]
+
+        deleted = []
+        inserted = []
+        stack = [(old_tree, new_tree, (), ())]
+        while stack:
+            old_node, new_node, old_path, new_path = stack.pop()
+            if old_node.structural_hash == new_node.structural_hash:
+                continue
+            if old_node.getValue() != new_node.getValue():
+                edits.append(Edit(UPDATE, old_path, new_path, old_node, new_node))
+            old_children = old_node.getChildren()
+            new_children = new_node.getChildren()
+            if not old_children and not new_children:
+                continue
+            pairs = self.alignChildren(old_children, new_children)
+
+            # Pairs whose old positions aren't in increasing order were reordered
+            stable = stableIndices([old_index for new_index, old_index in pairs])
+            matched_old = set()
+            children = []
+            for position, (new_index, old_index) in enumerate(pairs):
+                matched_old.add(old_index)
+                old_child = old_children[old_index]
+                new_child = new_children[new_index]
+                child_old_path = old_path + (old_index,)
+                child_new_path = new_path + (new_index,)
+                if position not in stable:
+                    edits.append(Edit(MOVE, child_old_path, child_new_path, old_child, new_child))
+                children.append((old_child, new_child, child_old_path, child_new_path))
+            stack.extend(reversed(children))
+
+            matched_new = {new_index for new_index, old_index in pairs}
+            deleted.extend(
+                (old_path + (index,), child) for index, child in enumerate(old_children) if index not in matched_old
+            )
+            inserted.extend(
+                (new_path + (index,), child) for index, child in enumerate(new_children) if index not in matched_new
+            )
+
+        # A subtree deleted in one place and inserted unchanged in another moved between parents
+        moved_from = {}
+        for path, node in deleted:
+            if not isinstance(node, Token):
+                moved_from.setdefault(node.structural_hash, deque()).append((path, node))
+        for path, node in inserted:
+            sources = moved_from.get(node.structural_hash) if not isinstance(node, Token) else None
+            if sources:
+                old_path, old_node = sources.popleft()
+                edits.append(Edit(MOVE, old_path, path, old_node, node))
+            else:
+                edits.append(Edit(INSERT, None, path, None, node))
+        for sources in moved_from.values():
+            edits.extend(Edit(DELETE, path, None, node, None) for path, node in sources)
+        edits.extend(Edit(DELETE, path, None, node, None) for path, node in deleted if isinstance(node, Token))
+        return edits
+
+
+
+def diffTrees(old_tree, new_tree):
+    """
+    Compute a compact edit script between two parses of the same file, without comparing text.
+    Children are aligned by structural hash, then in order by node type and value with a subtree-size
+    heuristic over a bounded window; identical subtrees are skipped without being walked, so the cost follows the size
+    of the change rather than the size of the trees.
+    Hashes are cached on the nodes, so don't change either tree between hashing and diffing.
+    @param old_tree The tree before the change
+    @param new_tree The tree after the change
+    @return a list of Edits: updates of values, inserts and deletes of subtrees and moves of subtrees,
+        with paths as tuples of child indices into the old and new trees
+    """
+    return TreeDiffer(old_tree, new_tree).diff()
@@ -0,0 +1,61 @@
+from ParseTree import *
+
+
+def findDuplicates(trees, min_nodes=5):
+    """
+    Find structurally identical subtrees within and across trees, e.g. repeated code across a project.
+    Tokens are never reported on their own.
+    @param trees A list of ParseTrees
+    @param min_nodes Smallest subtree size worth reporting
+    @return a dict from structural hash to a list of (tree index, node) pairs, for every hash seen at
+        least twice, largest subtrees first
+    """
+    groups = {}
+    sizes = {}
+    for index, tree in enumerate(trees):
+        tree.structuralHash()
+        tree_sizes = {}
+        countNodes(tree, tree_sizes)
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, Token):
+                continue
+            size = tree_sizes[node]
+            if size < min_nodes:
+                continue
+            groups.setdefault(node.structural_hash, []).append((index, node))
+            sizes[node.structural_hash] = size
+            stack.extend(node.getChildren())
+    duplicates = [(digest, nodes) for digest, nodes in groups.items() if len(nodes) > 1]
+    duplicates.sort(key=lambda item: -sizes[item[0]])
+    return dict(duplicates)
+
+
+def subroutineHashes(class_tree):
+    """
+    Get the structural hash of every subroutine in a class
+    @param class_tree The ParseTree of a class
+    @return a dict from subroutine name to its structural hash
+    """
+    hashes = {}
+    for child in class_tree.getChildren():
+        if child.getType() == "subroutine":
+            # constructor|function|method, type, name, ...
+            hashes[child.getChildren()[2].getValue()] = child.structuralHash()
+    return hashes
+
+
+def changedSubroutines(old_tree, new_tree):
+    """
+    Compare two parses of the same class by subroutine
+    @param old_tree The ParseTree of the class before the change
+    @param new_tree The ParseTree of the class after the change
+    @return (added, removed, changed) lists of subroutine names
+    """
+    old = subroutineHashes(old_tree)
+    new = subroutineHashes(new_tree)
+    added = [name for name in new if name not in old]
+    removed = [name for name in old if name not in new]
+    changed = [name for name in new if name in old and new[name] != old[name]]
+    return added, removed, changed
@@ -0,0 +1,303 @@
+import codecs
+import io
+import json
+import re
+from json.encoder import encode_basestring_ascii
+
+from ParseTree import *
+
+
+# Layouts:
+#   nested  interior nodes are [type, value, [children...]] and tokens are [type, value]
+#   flat    one array of nodes in preorder, interior nodes as [type, value, child count]
+#           and tokens as [type, value]
+NESTED = "nested"
+FLAT = "flat"
+
+CHUNK_SIZE = 1 << 16
+
+# One step of reading a tree back: a node header or whole token, with the comma before it if any,
+# or the brackets that close nodes and the flat array
+STRING = r'"(?:[^"\\]|\\.)*"'
+NODE_PATTERN = re.compile(
+    r"""\s*(?P<comma>,\s*)?(?:
+      \[\s*(?P<type>%s)\s*,\s*(?P<value>%s|null)\s*
+        (?:,\s*(?:(?P<count>[0-9]+)\s*\]|(?P<open>\[))|(?P<token>\]))
+    | (?P<close>\]\s*\])
+    | (?P<end>\])
+    )""" % (STRING, STRING),
+    re.VERBOSE,
+)
+
+WHITESPACE = re.compile(r"\s*")
+
+
+def iterJson(tree, layout=NESTED, chunk_size=CHUNK_SIZE):
+    """
+    Encode a tree as compact JSON without recursion or an intermediate copy of the tree
+    @param tree The root of the tree
+    @param layout NESTED or FLAT
+    @param chunk_size Approximate number of characters per chunk
+    @return a generator of str chunks that together form the JSON document
+    """
+    if layout not in (NESTED, FLAT):
+        raise ValueError(f"Unknown layout {layout!r}")
+    # Types and many values repeat, so encode each distinct string once
+    encoded = {None: "null"}
+    parts = []
+    size = 0
+    if layout == FLAT:
+        parts.append("[")
+    separator = ""
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if node.__class__ is str:
+            parts.append(node)
+            size += len(node)
+            continue
+        node_type = node.getType()
+        value = node.getValue()
+        encoded_type = encoded.get(node_type)
+        if encoded_type is None:
+            encoded_type = encoded[node_type] = encode_basestring_ascii(node_type)
+        encoded_value = encoded.get(value)
+        if encoded_value is None:
+            encoded_value = encoded[value] = encode_basestring_ascii(value)
+        if isinstance(node, Token):
+            piece = f"{separator}[{encoded_type},{encoded_value}]"
+        else:
+            children = node.getChildren()
+            if layout == NESTED:
+                piece = f"[{encoded_type},{encoded_value},["
+                stack.append("]]")
+                for index in range(len(children) - 1, 0, -1):
+                    stack.append(children[index])
+                    stack.append(",")
+                if children:
+                    stack.append(children[0])
+            else:
+                piece = f"{separator}[{encoded_type},{encoded_value},{len(children)}]"
+                stack.extend(reversed(children))
+        if layout == FLAT:
+            separator = ","
+        parts.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield "".join(parts)
+            parts = []
+            size = 0
+    if layout == FLAT:
+        parts.append("]")
+    if parts:
+        yield "".join(parts)
+
+
+def dumpTree(tree, stream, layout=NESTED, chunk_size=CHUNK_SIZE):
+    """
+    Write a tree as JSON to a text stream, one chunk at a time
+    @param tree The root of the tree
+    @param stream A writable text stream
+    @param layout NESTED or FLAT
+    @param chunk_size Approximate number of characters per write
+    """
+    for chunk in iterJson(tree, layout, chunk_size):
+        stream.write(chunk)
+
+
+def dumpsTree(tree, layout=NESTED):
+    """
+    @return the tree as a JSON string (see iterJson)
+    """
+    return "".join(iterJson(tree, layout))
+
+
+def decodeString(encoded):
+    """
+    @param encoded A JSON string literal, or null
+    @return the str (or None) it stands for
+    """
+    if encoded == "null":
+        return None
+    if "\\" in encoded:
+        return json.loads(encoded)
+    return encoded[1:-1]
+
+
+def scanTree(stream, chunk_size=CHUNK_SIZE):
+    """
+    Split the JSON written by iterJson() into node-sized pieces, reading the stream a chunk at a time
+    so only about one chunk is held in memory
+    @param stream A readable text or binary stream
+    @param chunk_size Characters (or bytes) to read at a time
+    @return a generator of NODE_PATTERN matches
+    """
+    decoder = None
+    buffer = ""
+    position = 0
+    at_end = False
+    match_at = NODE_PATTERN.match
+    while True:
+        match = match_at(buffer, position)
+        if match is not None:
+            end = match.end()
+            # A piece followed by nothing but whitespace may continue in the next chunk, e.g. "]" then "]"
+            if at_end or (end < len(buffer) and not buffer[end].isspace()) or (
+                WHITESPACE.match(buffer, end).end() < len(buffer)
+            ):
+                position = end
+                yield match
+                continue
+        elif at_end:
+            if WHITESPACE.match(buffer, position).end() == len(buffer):
+                return
+            raise ValueError(f"Unexpected JSON at {buffer[position:position + 20]!r}")
+        data = stream.read(chunk_size)
+        # Check for the end before decoding: a chunk that stops inside a character decodes to ""
+        if not data:
+            at_end = True
+        if isinstance(data, bytes):
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder("utf-8")()
+            data = decoder.decode(data, final=at_end)
+        buffer = buffer[position:] + data
+        position = 0
+
+
+def loadTree(stream, chunk_size=CHUNK_SIZE):
+    """
+    Rebuild a tree from JSON written by dumpTree(), in either layout, reading the stream incrementally
+    @param stream A readable text or binary stream
+    @param chunk_size Characters (or bytes) to read at a time
+    @return the root ParseTree (or Token)
+    """
+    # The flat layout starts with the bracket of the whole array, the nested layout with the root node
+    first = stream.read(1)
+    while first and first.isspace():
+        first = stream.read(1)
+    if first in ("[", b"["):
+        second = stream.read(1)
+        while second and second.isspace():
+            second = stream.read(1)
+        if second in ("[", b"["):
+            return loadFlat(scanTree(_Prefixed(second, stream), chunk_size))
+        stream = _Prefixed(first + second, stream)
+    else:
+        stream = _Prefixed(first, stream)
+    return loadNested(scanTree(stream, chunk_size))
+
+
+def loadNested(pieces):
+    """
+    Build a tree from the nested layout
+    @param pieces The scanTree() generator
+    @return the root node
+    """
+    root = None
+    # Interior nodes whose children are still being read, innermost last
+    stack = []
+    decoded = {"null": None}
+    for piece in pieces:
+        kind = piece.lastgroup
+        comma = piece.start("comma") >= 0
+        if kind == "close":
+            if not stack or comma:
+                raise ValueError("Unexpected ']' in nested JSON tree")
+            stack.pop()
+            if not stack:
+                break
+            continue
+        if kind not in ("token", "open") or (root is not None and not stack) or comma != bool(stack and stack[-1].children):
+            raise ValueError(f"Unexpected {piece.group().strip()!r} in nested JSON tree")
+        encoded_type, encoded_value = piece.group("type", "value")
+        node_type = decoded.get(encoded_type)
+        if node_type is None:
+            node_type = decoded[encoded_type] = decodeString(encoded_type)
+        value = decoded.get(encoded_value)
+        if value is None and encoded_value != "null":
+            value = decoded[encoded_value] = decodeString(encoded_value)
+        if kind == "token":
+            node = Token(node_type, value)
+        else:
+            node = ParseTree(node_type, value)
+        if stack:
+            stack[-1].children.append(node)
+        else:
+            root = node
+        if kind == "open":
+            stack.append(node)
+        elif not stack:
+            break
+    if root is None or stack:
+        raise ValueError("Incomplete JSON tree")
+    _expectEnd(pieces)
+    return root
+
+
+def loadFlat(pieces):
+    """
+    Build a tree from the flat preorder layout, one entry at a time
+    @param pieces The scanTree() generator, positioned after the opening bracket of the array
+    @return the root node
+    """
+    decoded = {"null": None}
+    closed = []
+
+    def entries():
+        first = True
+        for piece in pieces:
+            kind = piece.lastgroup
+            comma = piece.start("comma") >= 0
+            if kind == "end" and not comma and not first:
+                closed.append(True)
+                return
+            if kind not in ("token", "count") or comma == first:
+                raise ValueError(f"Unexpected {piece.group().strip()!r} in flat JSON tree")
+            first = False
+            encoded_type, encoded_value = piece.group("type", "value")
+            node_type = decoded.get(encoded_type)
+            if node_type is None:
+                node_type = decoded[encoded_type] = decodeString(encoded_type)
+            value = decoded.get(encoded_value)
+            if value is None and encoded_value != "null":
+                value = decoded[encoded_value] = decodeString(encoded_value)
+            if kind == "token":
+                yield Token(node_type, value), 0
+            else:
+                yield ParseTree(node_type, value), int(piece.group("count"))
+
+    root = buildPreorder(entries())
+    if not closed:
+        raise ValueError("Incomplete JSON tree")
+    _expectEnd(pieces)
+    return root
+
+
+class _Prefixed():
+
+    def __init__(self, prefix, stream):
+        """
+        A stream with some already-read data put back in front of it
+        """
+        self.prefix = prefix
+        self.stream = stream
+
+
+    def read(self, size):
+        if self.prefix:
+            data, self.prefix = self.prefix, self.prefix[:0]
+            return data
+        return self.stream.read(size)
+
+
+
+def _expectEnd(pieces):
+    if next(pieces, None) is not None:
+        raise ValueError("Unexpected data after the JSON tree")
+
+
+def loadsTree(text):
+    """
+    @return the tree encoded in a JSON string (see loadTree)
+    """
+    return loadTree(io.StringIO(text))
@@ -0,0 +1,164 @@
+import collections
+import functools
+import re
+
+from ParseTree import *
+
+
+# One step of a selector: optional combinator, then a node type or *, then an optional [value]
+STEP_PATTERN = re.compile(r'\s*(>)?\s*([A-Za-z_]\w*|\*)(?:\[(?:"([^"]*)"|([^\]"]*))\])?')
+
+
+class SelectorStep():
+
+    def __init__(self, node_type, value, child):
+        """
+        One compound selector in a compiled query
+        @param node_type The node type to match, or None for any type
+        @param value The value to match, or None for any value
+        @param child True if this step must be a direct child of the previous step's match,
+            False if any descendant will do
+        """
+        self.node_type = node_type
+        self.value = value
+        self.child = child
+
+
+    def test(self, node):
+        """
+        @return True if the node itself satisfies this step
+        """
+        return (self.node_type is None or node.getType() == self.node_type) and (
+            self.value is None or node.getValue() == self.value
+        )
+
+
+
+@functools.lru_cache(maxsize=256)
+def compileSelector(selector):
+    """
+    Compile a selector into a query plan. Compiled selectors are cached.
+    Selectors are node types separated by whitespace (descendant) or > (child), where * matches any
+    type and a [value] suffix also matches the node's value, e.g.
+    subroutine > subroutineBody statements letStatement or doStatement term > identifier[Output]
+    @param selector The selector string
+    @return a tuple of SelectorSteps, outermost first
+    """
+    steps = []
+    position = 0
+    selector = selector.strip()
+    while position < len(selector):
+        match = STEP_PATTERN.match(selector, position)
+        if match is None or match.end() == position:
+            raise ValueError(f"Bad selector at position {position}: {selector!r}")
+        combinator, node_type, quoted, bare = match.groups()
+        if combinator is not None and not steps:
+            raise ValueError(f"Selector can't start with '>': {selector!r}")
+        value = quoted if quoted is not None else bare
+        steps.append(SelectorStep(None if node_type == "*" else node_type, value, combinator is not None))
+        position = match.end()
+    if not steps:
+        raise ValueError("Empty selector")
+    return tuple(steps)
+
+
+class TreeIndex():
+
+    def __init__(self, tree):
+        """
+        Index of a tree's nodes by node_type, with parent links, built on the first query.
+        Queries run from the index rather than walking the tree. If the tree changes, call refresh().
+        @param tree The root of the tree to index
+        """
+        self.tree = tree
+        self.by_type = None
+        self.nodes = None
+        self.parents = None
+
+
+    def refresh(self):
+        """
+        Discard the index so the next query rebuilds it
+        """
+        self.by_type = None
+
+
+    def build(self):
+        """
+        Walk the tree once, without recursion, recording nodes in document order.
+        Parent links are keyed by node, so a node object may only appear once in the tree.
+        @throws ValueError if the same node object is found at two positions
+        """
+        by_type = collections.defaultdict(list)
+        nodes = []
+        parents = {}
+        stack = [(self.tree, None)]
+        while stack:
+            node, parent = stack.pop()
+            if id(node) in parents:
+                raise ValueError(f"Node {node.getType()} {node.getValue()} appears more than once in the tree")
+            parents[id(node)] = parent
+            nodes.append(node)
+            by_type[node.getType()].append(node)
+            stack.extend((child, node) for child in reversed(node.getChildren()))
+        self.nodes = nodes
+        self.parents = parents
+        self.by_type = by_type
+
+
+    def parent(self, node):
+        """
+        Get the parent of a node in the indexed tree
+        @param node A node of the tree
+        @return the parent node, or None for the root
+        """
+        if self.by_type is None:
+            self.build()
+        return self.parents.get(id(node))
+
+
+    def select(self, selector):
+        """
+        Find every node matching a selector
+        @param selector The selector string (see compileSelector)
+        @return a list of matching nodes in document order
+        """
+        if self.by_type is None:
+            self.build()
+        steps = compileSelector(selector)
+        last = steps[-1]
+        if last.node_type is None:
+            candidates = self.nodes
+        else:
+            candidates = self.by_type.get(last.node_type, ())
+        return [node for node in candidates if last.test(node) and self.matchAncestors(node, steps, len(steps) - 1)]
+
+
+    def matchAncestors(self, node, steps, index):
+        """
+        Check the steps before steps[index] against the ancestors of a node that matched steps[index]
+        @return True if the ancestors satisfy the rest of the selector
+        """
+        if index == 0:
+            return True
+        step = steps[index - 1]
+        parent = self.parents.get(id(node))
+        if steps[index].child:
+            return parent is not None and step.test(parent) and self.matchAncestors(parent, steps, index - 1)
+        while parent is not None:
+            if step.test(parent) and self.matchAncestors(parent, steps, index - 1):
+                return True
+            parent = self.parents.get(id(parent))
+        return False
+
+
+
+def select(tree, selector):
+    """
+    Find every node of a tree matching a selector. This walks the whole tree on each call;
+    to run several queries against the same tree, build a TreeIndex once and query that.
+    @param tree The root of the tree
+    @param selector The selector string (see compileSelector)
+    @return a list of matching nodes in document order
+    """
+    return TreeIndex(tree).select(selector)
@@ -0,0 +1,133 @@
+import sys
+
+from ParseTree import *
+
+
+# Only nodes with at least this many subtrees as children are sampled
+SAMPLE_MIN_CHILDREN = 8
+
+
+class TreeStats():
+
+    def __init__(self):
+        """
+        Size and shape of a parse tree, as measured by treeStats()
+        """
+        self.nodes = 0
+        self.leaves = 0
+        self.interior = 0
+        self.max_depth = 0
+        self.memory = 0
+        self.by_type = {}
+        self.sample_rate = None
+
+
+    def leafRatio(self):
+        """
+        @return leaves per interior node
+        """
+        return self.leaves / self.interior if self.interior else float(self.leaves)
+
+
+    def asDict(self):
+        """
+        Get the statistics as plain data, e.g. to attach to benchmark or profiling results
+        @return a dict that can be serialised as JSON
+        """
+        return {
+            "nodes": self.nodes,
+            "leaves": self.leaves,
+            "interior": self.interior,
+            "leaf_ratio": self.leafRatio(),
+            "max_depth": self.max_depth,
+            "memory_bytes": self.memory,
+            "by_type": dict(sorted(self.by_type.items(), key=lambda item: -item[1])),
+            "sample_rate": self.sample_rate,
+        }
+
+
+    def __str__(self):
+        """
+        @return a short human-readable report
+        """
+        estimate = f" (estimated from a {self.sample_rate:.0%} sample)" if self.sample_rate is not None else ""
+        lines = [
+            f"nodes {self.nodes}{estimate}",
+            f"leaves {self.leaves}, interior {self.interior}, leaf/interior {self.leafRatio():.2f}",
+            f"max depth {self.max_depth}",
+            f"memory {self.memory / 1024:.1f} KiB",
+        ]
+        for node_type, count in sorted(self.by_type.items(), key=lambda item: -item[1]):
+            lines.append(f"  {node_type:<16} {count}")
+        return "\n".join(lines)
+
+
+
+def treeStats(tree, sample_rate=None):
+    """
+    Measure a tree without recursion. Memory is the deep size of the node objects, their child
+    lists and their strings, counting objects shared between nodes once.
+    For huge trees, a sample_rate below 1 visits only that fraction (evenly spaced, for each type of
+    child separately) of the subtrees of wide nodes, such as long statement lists or classes with many
+    subroutines, and scales the counts up to estimate the whole tree; max_depth is then the deepest path that was sampled.
+    @param tree The root of the tree
+    @param sample_rate Fraction of subtrees of wide nodes to visit, or None to visit everything
+    @return a TreeStats
+    """
+    stats = TreeStats()
+    stats.sample_rate = sample_rate
+    # Keep measured objects alive so ids of temporaries (e.g. SharedTree handles) can't be reused
+    seen = {}
+    counts = {}
+    nodes = leaves = interior = memory = 0.0
+    max_depth = 0
+    # Each entry carries the node's weight: how many nodes of the full tree it stands for
+    stack = [(tree, 1, 1.0)]
+    while stack:
+        node, depth, weight = stack.pop()
+        children = node.getChildren()
+        nodes += weight
+        if depth > max_depth:
+            max_depth = depth
+        node_type = node.getType()
+        counts[node_type] = counts.get(node_type, 0.0) + weight
+
+        size = 0
+        value = node.value
+        for item in (node, children, node_type, value):
+            if item is not None and id(item) not in seen:
+                seen[id(item)] = item
+                size += sys.getsizeof(item)
+        memory += size * weight
+
+        if not children:
+            leaves += weight
+            continue
+        interior += weight
+        subtrees = [child for child in children if child.getChildren()]
+        if sample_rate is None or len(subtrees) < SAMPLE_MIN_CHILDREN:
+            stack.extend((child, depth + 1, weight) for child in children)
+        else:
+            # Leaves are cheap and varied, so only subtrees are sampled
+            stack.extend((child, depth + 1, weight) for child in children if not child.getChildren())
+            # Sample each type of child separately, so a few small declarations don't stand in for the
+            # subroutines or statements around them
+            groups = {}
+            for child in subtrees:
+                groups.setdefault(child.getType(), []).append(child)
+            step = max(1, round(1 / sample_rate))
+            for group in groups.values():
+                if len(group) < SAMPLE_MIN_CHILDREN:
+                    stack.extend((child, depth + 1, weight) for child in group)
+                    continue
+                sample = group[step // 2::step]
+                child_weight = weight * len(group) / len(sample)
+                stack.extend((child, depth + 1, child_weight) for child in sample)
+
+    stats.nodes = round(nodes)
+    stats.leaves = round(leaves)
+    stats.interior = round(interior)
+    stats.max_depth = max_depth
+    stats.memory = round(memory)
+    stats.by_type = {node_type: round(count) for node_type, count in counts.items()}
+    return stats
@@ -0,0 +1,259 @@
+import argparse
+import gc
+import time
+
+from ParseTree import *
+from CompilerParser import CompilerParser
+from JackTokenizer import KEYWORDS
+
+
+SYMBOLS = frozenset("{}()[].,;+-*/&|<>=~")
+
+# One synthetic subroutine, pre-split on whitespace. {n} is replaced by the subroutine number.
+SUBROUTINE_WORDS = """
+method int run{n} ( int a , int b ) {{
+    var int i , total ;
+    var Array data ;
+    let i = 0 ;
+    let total = a + b * 2 ;
+    while ( i < b ) {{
+        let data [ i ] = total - i ;
+        let i = i + 1 ;
+    }}
+    if ( total > 100 ) {{
+        do Output . printInt ( total , " items " ) ;
+    }} else {{
+        let total = ( a + 1 ) ;
+    }}
+    return total ;
+}}
+"""
+
+
+def syntheticTokens(subroutines):
+    """
+    Generate the tokens of a class with the given number of identical-shaped subroutines
+    @param subroutines Number of subroutines in the class
+    @return a list of Tokens
+    """
+    words = ["class", "Bench", "{", "field", "int", "size", ";"]
+    for n in range(subroutines):
+        words.extend(SUBROUTINE_WORDS.format(n=n).split())
+    words.append("}")
+    tokens = []
+    in_string = False
+    for word in words:
+        if word == '"':
+            in_string = not in_string
+        elif in_string:
+            tokens.append(Token("stringConstant", word))
+        elif word in KEYWORDS:
+            tokens.append(Token("keyword", word))
+        elif word in SYMBOLS:
+            tokens.append(Token("symbol", word))
+        elif word.isdigit():
+            tokens.append(Token("integerConstant", word))
+        else:
+            tokens.append(Token("identifier", word))
+    return tokens
+
+
+def syntheticSource(subroutines):
+    """
+    Generate Jack source for the same class as syntheticTokens(), with comments
+    @param subroutines Number of subroutines in the class
+    @return the source as a str
+    """
+    parts = ["class Bench {\n    field int size;\n"]
+    for n in range(subroutines):
+        parts.append(f"    // subroutine {n}\n    /** Adds things up. */\n")
+        parts.append(SUBROUTINE_WORDS.format(n=n))
+    parts.append("}\n")
+    return "".join(parts)
+
+
+def timed(function, repeat):
+    """
+    Run a function several times and keep the fastest run. Like timeit, the cycle collector
+    is paused while timing so its pauses don't land on whichever run happens to trigger them.
+    @param function The function to time
+    @param repeat Number of runs
+    @return (best time in seconds, result of the last run)
+    """
+    best = None
+    result = None
+    for i in range(repeat):
+        result = None
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            result = function()
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def printStats(args, tree):
+    """
+    Print size and shape statistics for a benchmarked tree when --stats was given
+    """
+    if args.stats:
+        from TreeStats import treeStats
+
+        print(treeStats(tree, args.sample))
+
+
+def benchLex(args):
+    """
+    Compare the master-pattern tokenizer with the character-at-a-time baseline
+    """
+    from JackTokenizer import JackTokenizer
+
+    tokenizer = JackTokenizer(syntheticSource(args.subroutines))
+    megabytes = len(tokenizer.source.data) / 1e6
+    print(f"{megabytes:.2f} MB of source, best of {args.repeat}")
+    results = []
+    for name, tokenize in (("char loop", tokenizer.tokenizeByCharacter), ("regex", tokenizer.tokenize)):
+        elapsed, tokens = timed(tokenize, args.repeat)
+        results.append([(token.node_type, token.value) for token in tokens])
+        print(f"{name:<10} {len(tokens):>10} tokens {megabytes / elapsed:>8.2f} MB/s")
+    print("tokens match" if results[0] == results[1] else "TOKENS DIFFER")
+    # The same scan without creating Token objects, to separate lexing from allocation
+    from JackTokenizer import MASTER_PATTERN, LAST_TOKEN_GROUP
+
+    scan = lambda: sum(1 for match in MASTER_PATTERN.finditer(tokenizer.source.data) if match.lastindex <= LAST_TOKEN_GROUP)
+    elapsed, count = timed(scan, args.repeat)
+    print(f"{'scan only':<10} {count:>10} tokens {megabytes / elapsed:>8.2f} MB/s")
+
+
+def benchAbstract(args):
+    """
+    Compare the concrete and abstract tree modes on the same tokens
+    """
+    from AbstractTree import parseAbstract
+
+    tokens = syntheticTokens(args.subroutines)
+    modes = [
+        ("concrete", lambda: CompilerParser(tokens).compileProgram()),
+        ("abstract", lambda: parseAbstract(tokens)),
+    ]
+    print(f"{len(tokens)} tokens, best of {args.repeat}")
+    print(f"{'mode':<10} {'nodes':>10} {'parse ms':>10} {'walk ms':>10}")
+    times = []
+    for name, parse in modes:
+        parse_time, tree = timed(parse, args.repeat)
+        walk_time, nodes = timed(lambda: countNodes(tree), args.repeat)
+        times.append((parse_time, walk_time))
+        print(f"{name:<10} {nodes:>10} {parse_time * 1000:>10.1f} {walk_time * 1000:>10.1f}")
+        printStats(args, tree)
+    (concrete_parse, concrete_walk), (abstract_parse, abstract_walk) = times
+    print(f"abstract parse costs {abstract_parse / concrete_parse:.2f}x, walks {concrete_walk / abstract_walk:.2f}x faster")
+    if abstract_walk < concrete_walk:
+        walks = (abstract_parse - concrete_parse) / (concrete_walk - abstract_walk)
+        print(f"the extra parse time is repaid after {max(0.0, walks):.1f} full walks of the tree")
+
+
+class InlineExecutor():
+
+    def __init__(self):
+        """
+        Stands in for a process pool, running each task in this process and adding up the time
+        spent inside the tasks, so the work left to the parent can be measured on its own
+        """
+        self.task_time = 0.0
+
+
+    def map(self, function, *iterables):
+        results = []
+        for arguments in zip(*iterables):
+            start = time.perf_counter()
+            results.append(function(*arguments))
+            self.task_time += time.perf_counter() - start
+        return results
+
+
+
+def benchParallel(args):
+    """
+    Compare serial parsing with subroutine-parallel parsing of one large class, and measure how much
+    of the parallel parse the parent does alone, which bounds the speedup on any number of cores
+    """
+    import concurrent.futures
+    from ParallelParser import compileProgramParallel
+
+    with concurrent.futures.ProcessPoolExecutor(args.workers) as pool:
+        for subroutines in args.subroutines:
+            tokens = syntheticTokens(subroutines)
+            print(f"{subroutines} subroutines, {len(tokens)} tokens, best of {args.repeat}")
+            serial = lambda: CompilerParser(tokens).compileProgram()
+            parallel = lambda: compileProgramParallel(tokens, args.workers, executor=pool)[0]
+            print(f"  {'':<14} {'parse ms':>10} {'+ walk ms':>10}")
+            for name, parse in (("serial", serial), (f"parallel x{args.workers}", parallel)):
+                parse_time, tree = timed(parse, args.repeat)
+                total_time, nodes = timed(lambda: countNodes(parse()), args.repeat)
+                print(f"  {name:<14} {parse_time * 1000:>10.1f} {total_time * 1000:>10.1f}")
+                if name == "serial":
+                    serial_time, serial_tree = parse_time, tree
+            print("  trees match" if str(serial_tree) == str(tree) else "  TREES DIFFER")
+
+            # The same parse with every task run here, to split parent work from worker work
+            inline = InlineExecutor()
+            begin = time.perf_counter()
+            compileProgramParallel(tokens, args.workers, executor=inline)
+            parent_time = time.perf_counter() - begin - inline.task_time
+            print(
+                f"  parent work {parent_time * 1000:.1f} ms, worker work {inline.task_time * 1000:.1f} ms: "
+                f"at most {serial_time / parent_time:.1f}x faster than serial on any number of cores"
+            )
+            printStats(args, tree)
+
+
+def benchSemantic(args):
+    """
+    Compare serial semantic checking with checking subroutines on a worker pool
+    """
+    import concurrent.futures
+    from SemanticChecker import checkProgram
+
+    tree = CompilerParser(syntheticTokens(args.subroutines)).compileProgram()
+    print(f"{args.subroutines} subroutines, best of {args.repeat}")
+    serial_time, serial = timed(lambda: checkProgram(tree, workers=0), args.repeat)
+    print(f"{'serial':<16} {serial_time * 1000:>10.1f} ms")
+    with concurrent.futures.ProcessPoolExecutor(args.workers) as pool:
+        parallel_time, parallel = timed(lambda: checkProgram(tree, executor=pool), args.repeat)
+    print(f"{'parallel x' + str(args.workers):<16} {parallel_time * 1000:>10.1f} ms")
+    same = [str(d) for d in serial] == [str(d) for d in parallel]
+    print(f"{len(serial)} diagnostics, " + ("results match" if same else "RESULTS DIFFER"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parser benchmarks")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement, fastest is kept")
+    parser.add_argument("--stats", action="store_true", help="print tree statistics for each result")
+    parser.add_argument("--sample", type=float, default=None, help="estimate statistics from this fraction of nodes")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    lex = commands.add_parser("lex", help="regex tokenizer vs character loop")
+    lex.add_argument("--subroutines", type=int, default=2000)
+    lex.set_defaults(run=benchLex)
+
+    abstract = commands.add_parser("abstract", help="concrete vs abstract tree mode")
+    abstract.add_argument("--subroutines", type=int, default=500)
+    abstract.set_defaults(run=benchAbstract)
+
+    parallel = commands.add_parser("parallel", help="serial vs subroutine-parallel parsing")
+    parallel.add_argument("--subroutines", type=int, nargs="+", default=[64, 2000])
+    parallel.add_argument("--workers", type=int, default=4)
+    parallel.set_defaults(run=benchParallel)
+
+    semantic = commands.add_parser("semantic", help="serial vs parallel semantic checking")
+    semantic.add_argument("--subroutines", type=int, default=2000)
+    semantic.add_argument("--workers", type=int, default=4)
+    semantic.set_defaults(run=benchSemantic)
+
+    args = parser.parse_args()
+    args.run(args)
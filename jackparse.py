@@ -0,0 +1,159 @@
+import argparse
+import sys
+
+# Only argparse and sys are imported up front; each command imports what it needs, so starting
+# the CLI (or asking for --help) doesn't pay for the tokenizer, parser or hashing modules.
+
+
+def loadTokens(args, path):
+    """
+    Get the tokens of a source file, through the .jackt cache when --cache is given
+    @return a list of tokens
+    """
+    if args.cache:
+        from TokenCache import loadTokens as loadCached
+        tokens, from_cache = loadCached(path)
+        return tokens
+    from JackTokenizer import JackTokenizer
+    return JackTokenizer.fromFile(path).tokenize()
+
+
+def parseFile(args, path):
+    """
+    Tokenize and parse one file, printing any problems to stderr
+    @return (tree, diagnostics) where tree is None if parsing failed
+    """
+    from ParseTree import ParseException
+    from JackWatcher import parseTokens
+
+    try:
+        tokens = loadTokens(args, path)
+    except (OSError, ParseException) as e:
+        print(f"{path}: {e}", file=sys.stderr)
+        return None, [str(e)]
+    tree, diagnostics = parseTokens(tokens)
+    for diagnostic in diagnostics:
+        print(f"{path}: {diagnostic}", file=sys.stderr)
+    return tree, diagnostics
+
+
+def commandTokenize(args):
+    """
+    Print the tokens of each file, one per line
+    """
+    from ParseTree import ParseException
+
+    status = 0
+    out = sys.stdout
+    for path in args.files:
+        try:
+            tokens = loadTokens(args, path)
+        except (OSError, ParseException) as e:
+            print(f"{path}: {e}", file=sys.stderr)
+            status = 1
+            continue
+        if args.count:
+            print(f"{path}: {len(tokens)} tokens")
+            continue
+        out.writelines(f"{token.getType()} {token.getValue()}\n" for token in tokens)
+    return status
+
+
+def commandParse(args):
+    """
+    Parse each file and report whether it parsed cleanly
+    """
+    status = 0
+    for path in args.files:
+        tree, diagnostics = parseFile(args, path)
+        if diagnostics:
+            status = 1
+        elif not args.quiet:
+            print(f"{path}: ok")
+    return status
+
+
+def commandRender(args):
+    """
+    Print the parse tree of each file as indented text or JSON.
+    Files with problems still have their tree printed if one was built, but make the exit status 1.
+    """
+    status = 0
+    for path in args.files:
+        tree, diagnostics = parseFile(args, path)
+        if diagnostics:
+            status = 1
+        if tree is None:
+            continue
+        if args.format == "text":
+            sys.stdout.write(str(tree))
+        else:
+            from TreeJson import dumpTree
+            dumpTree(tree, sys.stdout, args.format)
+            sys.stdout.write("\n")
+    return status
+
+
+def commandStats(args):
+    """
+    Print the size and shape of each file's parse tree.
+    Files with problems still get statistics if a tree was built, but make the exit status 1.
+    """
+    from TreeStats import treeStats
+
+    status = 0
+    for path in args.files:
+        tree, diagnostics = parseFile(args, path)
+        if diagnostics:
+            status = 1
+        if tree is None:
+            continue
+        stats = treeStats(tree, args.sample)
+        if args.json:
+            import json
+            print(json.dumps({"path": path, **stats.asDict()}))
+        else:
+            print(path)
+            print(stats)
+    return status
+
+
+def main(argv=None):
+    """
+    Run the jackparse command line
+    @param argv Arguments, without the program name (sys.argv[1:] by default)
+    @return the exit status
+    """
+    parser = argparse.ArgumentParser(prog="jackparse", description="Tokenize, parse and inspect .jack files")
+    parser.add_argument("-c", "--cache", action="store_true",
+                        help="reuse tokens from .jackt files next to the sources, writing them when missing or stale")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    tokenize = commands.add_parser("tokenize", help="print the tokens of each file")
+    tokenize.add_argument("files", nargs="+")
+    tokenize.add_argument("--count", action="store_true", help="only print how many tokens each file has")
+    tokenize.set_defaults(run=commandTokenize)
+
+    parse = commands.add_parser("parse", help="check that each file parses")
+    parse.add_argument("files", nargs="+")
+    parse.add_argument("-q", "--quiet", action="store_true", help="only report problems")
+    parse.set_defaults(run=commandParse)
+
+    render = commands.add_parser("render", help="print the parse tree of each file")
+    render.add_argument("files", nargs="+")
+    render.add_argument("--format", choices=("text", "nested", "flat"), default="text",
+                        help="indented text, or JSON in the nested or flat layout")
+    render.set_defaults(run=commandRender)
+
+    stats = commands.add_parser("stats", help="print parse tree statistics for each file")
+    stats.add_argument("files", nargs="+")
+    stats.add_argument("--sample", type=float, default=None, help="estimate from this fraction of wide nodes' subtrees")
+    stats.add_argument("--json", action="store_true", help="print one JSON object per file")
+    stats.set_defaults(run=commandStats)
+
+    args = parser.parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
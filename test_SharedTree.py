@@ -0,0 +1,53 @@
+import gc
+import unittest
+
+from ParseTree import *
+from CompilerParser import CompilerParser
+from SharedTree import parseShared
+from TreeDiff import diffTrees
+from TreeQuery import TreeIndex
+from benchmark import syntheticTokens
+
+
+class SharedTreeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tokens = syntheticTokens(50)
+        self.plain = CompilerParser(self.tokens).compileProgram()
+        self.shared = parseShared(self.tokens)
+
+
+    def test_select_matches_plain_tree(self):
+        for selector in ("letStatement > identifier[i]", "whileStatement expression", "keyword[return]", "symbol"):
+            plain = TreeIndex(self.plain).select(selector)
+            shared = TreeIndex(self.shared).select(selector)
+            self.assertEqual([str(node) for node in shared], [str(node) for node in plain], selector)
+
+
+    def test_token_positions_are_distinct(self):
+        tokens = TreeIndex(self.shared).select("identifier[i]")
+        self.assertEqual(len({id(token) for token in tokens}), len(tokens))
+
+
+    def test_diff_matches_plain_tree(self):
+        tokens = list(self.tokens)
+        tokens[29] = Token("identifier", "j")
+        plain = diffTrees(self.plain, CompilerParser(tokens).compileProgram())
+        shared = diffTrees(self.shared, parseShared(tokens))
+        self.assertTrue(plain)
+        self.assertEqual([str(edit) for edit in shared], [str(edit) for edit in plain])
+        self.assertEqual(diffTrees(self.plain, self.shared), [])
+
+
+    def test_changes_are_kept(self):
+        body = self.shared.getChildren()[4].getChildren()[-1]
+        body.getChildren().append(Token("keyword", "x"))
+        del body
+        gc.collect()
+        self.assertEqual(len(TreeIndex(self.shared).select("subroutineBody > keyword[x]")), 1)
+        self.assertEqual(str(self.shared.getChildren()[5]), str(self.plain.getChildren()[5]))
+
+
+
+if __name__ == "__main__":
+    unittest.main()